@@ -1,17 +1,78 @@
 import psycopg2
+import psycopg2.extras
+import psycopg2.pool
 import json
 import os
+import threading
 from datetime import datetime, timedelta
-import pytz
 import random
-from itertools import combinations
-
-OFFICE_TIMEZONE = pytz.timezone("Europe/Amsterdam")  # Or your specific office timezone
-
+import bisect
+import functools
+from collections import deque, namedtuple
+from operator import attrgetter
+
+DAY_LABELS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday")
+# The only day pairs project teams can be allocated to
+PROJECT_DAY_PAIRS = (("Monday", "Wednesday"), ("Tuesday", "Thursday"))
+# (day1_label, day2_label) -> index into PROJECT_DAY_PAIRS
+PROJECT_DAY_PAIR_INDEX = {pair: pair_idx for pair_idx, pair in enumerate(PROJECT_DAY_PAIRS)}
+ROOMS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rooms.json")
+
+# A project room from rooms.json; the reserved_* fields are only set for reserved rooms
+Room = namedtuple("Room", ["name", "capacity", "reserved_for", "reserved_project", "reserved_until"],
+                  defaults=(None, None, None))
+
+# rooms_file_path -> (mtime, (project_rooms, oasis_config))
+_ROOMS_CACHE = {}
+
+# database_url -> ThreadedConnectionPool, created lazily on first allocation run
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+def _get_pool(database_url):
+    """Return the connection pool for database_url, creating it on first use."""
+    with _POOLS_LOCK:
+        pool = _POOLS.get(database_url)
+        if pool is None:
+            pool = psycopg2.pool.ThreadedConnectionPool(1, 4, database_url, application_name="room_allocator")
+            _POOLS[database_url] = pool
+        return pool
+
+def _load_rooms(rooms_file_path=ROOMS_FILE):
+    """
+    Load the room configuration, re-reading rooms.json only when its mtime changes.
+    
+    Returns:
+        tuple: (project Room tuples sorted by capacity, oasis_config dict or None)
+    
+    Raises:
+        FileNotFoundError, json.JSONDecodeError: If rooms.json is missing or invalid
+    """
+    mtime = os.path.getmtime(rooms_file_path)
+    cached = _ROOMS_CACHE.get(rooms_file_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with open(rooms_file_path, "r") as f:
+        all_rooms_config = json.load(f)
+
+    project_rooms = sorted(
+        (
+            Room(r["name"], r["capacity"], r.get("reserved_for"), r.get("reserved_project"), r.get("reserved_until"))
+            for r in all_rooms_config if r.get("name") != "Oasis" and "capacity" in r and "name" in r
+        ),
+        key=attrgetter("capacity")
+    )
+    oasis_config = next((r for r in all_rooms_config if r.get("name") == "Oasis" and "capacity" in r), None)
+    _ROOMS_CACHE[rooms_file_path] = (mtime, (project_rooms, oasis_config))
+    return project_rooms, oasis_config
+
+@functools.lru_cache(maxsize=8)
 def get_day_mapping(base_monday_date=None):
     """
     Get day mapping for the week using the provided base_monday_date.
     NO automatic date calculation - base_monday_date is required.
+    The result is cached per Monday and shared between calls, so treat it as read-only.
     """
     if base_monday_date is None:
         raise ValueError("base_monday_date is required - no automatic date calculation allowed. This prevents unexpected week resets.")
@@ -22,22 +83,234 @@ def get_day_mapping(base_monday_date=None):
     
     this_monday = base_monday_date
     
-    return {
-        "Monday": this_monday,
-        "Tuesday": this_monday + timedelta(days=1),
-        "Wednesday": this_monday + timedelta(days=2),
-        "Thursday": this_monday + timedelta(days=3),
-        "Friday": this_monday + timedelta(days=4),
-    }
-
-def run_allocation(database_url, only=None, base_monday_date=None):
+    return {day_label: this_monday + timedelta(days=day_idx) for day_idx, day_label in enumerate(DAY_LABELS)}
+
+def get_week_seed(base_monday_date):
+    """
+    Seed for the week's random tie-breaks, e.g. 202422 for the Monday of week 22 in 2024.
+    Re-running an allocation for the same week with the same preferences gives the same result.
+    """
+    return int(base_monday_date.strftime("%Y%W"))
+
+def fetch_preferences(conn, only=None):
+    """
+    Fetch team and Oasis preferences in a single query, streamed through a
+    server-side cursor so large preference tables are never held in full.
+    
+    Args:
+        conn: Open database connection (inside a transaction)
+        only: "project" or "oasis" to fetch only that table, None for both
+    
+    Returns:
+        tuple: (team_rows, person_rows) shaped like the per-table SELECTs, except that
+        team preferred_days is already a list of trimmed, capitalized day labels
+    """
+    queries = []
+    if only in [None, "project"]:
+        # Split/trim/capitalize "Monday, wednesday" into {Monday,Wednesday} server-side, keeping order
+        queries.append("SELECT 'team', team_name, team_size, "
+                       "ARRAY(SELECT INITCAP(TRIM(day)) "
+                       "FROM unnest(string_to_array(preferred_days, ',')) WITH ORDINALITY AS d(day, ord) "
+                       "WHERE TRIM(day) <> '' ORDER BY ord), "
+                       "NULL, NULL, NULL, NULL, NULL FROM weekly_preferences")
+    if only in [None, "oasis"]:
+        queries.append("SELECT 'oasis', person_name, NULL, NULL::text[], "
+                       "preferred_day_1, preferred_day_2, preferred_day_3, preferred_day_4, preferred_day_5 "
+                       "FROM oasis_preferences")
+    if not queries:
+        return [], []
+
+    team_rows = []
+    person_rows = []
+    with conn.cursor(name="pref_stream") as named_cur:
+        named_cur.itersize = 500
+        # Fixed row order so the seeded shuffles are reproducible
+        named_cur.execute(" UNION ALL ".join(queries) + " ORDER BY 1, 2")
+        for kind, name, team_size, preferred_days, d1, d2, d3, d4, d5 in named_cur:
+            if kind == "team":
+                team_rows.append((name, team_size, preferred_days))
+            else:
+                person_rows.append((name, d1, d2, d3, d4, d5))
+    return team_rows, person_rows
+
+def find_best_fit_rooms(rooms_sorted, capacities, team_size, used_mask1, used_mask2):
+    """
+    Return the unused rooms with the smallest capacity that still fits the team.
+    
+    Args:
+        rooms_sorted: Rooms sorted by ascending capacity
+        capacities: Capacities of rooms_sorted, in the same order
+        team_size: Number of people that need to fit
+        used_mask1, used_mask2: Bitmasks of rooms_sorted indices already taken on each day
+    
+    Returns:
+        list: Best-fit rooms (empty if nothing fits)
+    """
+    # Rooms are sorted, so every index from the first fitting one upwards is big enough
+    first_fit = bisect.bisect_left(capacities, team_size)
+    free_mask = ((1 << len(rooms_sorted)) - 1) ^ ((1 << first_fit) - 1)
+    free_mask &= ~(used_mask1 | used_mask2)
+
+    # Single pass: the first free room fixes the best capacity, stop at the next size up
+    best_fit_rooms = []
+    best_capacity = None
+    while free_mask:
+        lowest_bit = free_mask & -free_mask
+        idx = lowest_bit.bit_length() - 1
+        if best_capacity is None:
+            best_capacity = capacities[idx]
+        elif capacities[idx] != best_capacity:
+            break
+        best_fit_rooms.append(rooms_sorted[idx])
+        free_mask ^= lowest_bit
+    return best_fit_rooms
+
+def count_free_fitting_rooms(capacities, team_size, used_mask):
+    """Count the rooms in capacities (ascending) that fit team_size and are not set in used_mask."""
+    first_fit = bisect.bisect_left(capacities, team_size)
+    fitting_mask = ((1 << len(capacities)) - 1) ^ ((1 << first_fit) - 1)
+    return bin(fitting_mask & ~used_mask).count("1")
+
+def largest_free_capacity(capacities, used_mask):
+    """Capacity of the biggest room in capacities (ascending) not set in used_mask, 0 if all are taken."""
+    free_mask = ((1 << len(capacities)) - 1) & ~used_mask
+    return capacities[free_mask.bit_length() - 1] if free_mask else 0
+
+def room_names_in_mask(rooms_sorted, mask):
+    """Decode a used-room bitmask back to room names (for logging)."""
+    return [room.name for idx, room in enumerate(rooms_sorted) if mask >> idx & 1]
+
+def assign_best_fit_room(team_name, team_size, date1, date2,
+                         rooms_sorted, room_capacities, room_bits, used_room_masks, placed_teams_info, rng):
+    """
+    Give a team a random best-fit room that is free on both dates and mark it used.
+    
+    Returns:
+        Room: The chosen room, or None if no free room fits (nothing is changed then)
+    """
+    best_fit_rooms = find_best_fit_rooms(
+        rooms_sorted, room_capacities, team_size, used_room_masks[date1], used_room_masks[date2]
+    )
+    print(f"    Best-fit rooms: {[r.name for r in best_fit_rooms]} (capacity >= {team_size})")
+    if not best_fit_rooms:
+        return None
+    chosen_room = rng.choice(best_fit_rooms)
+    used_room_masks[date1] |= room_bits[chosen_room.name]
+    used_room_masks[date2] |= room_bits[chosen_room.name]
+    placed_teams_info[team_name] = (chosen_room.name, date1, date2)
+    return chosen_room
+
+def place_teams_on_pair(teams, day1_label, day2_label, date1, date2,
+                        rooms_sorted, room_capacities, room_bits, used_room_masks, placed_teams_info, rng):
+    """
+    Greedily place teams on one day pair, largest teams first, each in a random best-fit room.
+    
+    Args:
+        teams: (team_name, team_size, pref_labels) tuples that prefer this pair
+        day1_label, day2_label: Day labels of the pair (for logging)
+        date1, date2: Dates of the pair
+        rooms_sorted, room_capacities, room_bits: Available rooms by capacity, their capacities and bits
+        used_room_masks: date -> used-room bitmask, updated in place
+        placed_teams_info: team_name -> (room_name, date1, date2), updated in place
+        rng: Seeded random.Random used for tie-breaks
+    
+    Returns:
+        list: Teams that could not be placed on this pair
+    """
+    # Largest teams first, ties between equal sizes broken at random
+    sorted_teams_for_pair = sorted(teams, key=lambda x: (-x[1], rng.random()))
+    still_unplaced_from_this_pair = []
+
+    print(f"Attempting placement for {day1_label}/{day2_label} - {len(sorted_teams_for_pair)} teams")
+    print(f"  Teams to place: {[t[0] for t in sorted_teams_for_pair]}")
+    print(f"  Rooms already used on {day1_label}: {room_names_in_mask(rooms_sorted, used_room_masks[date1])}")
+    print(f"  Rooms already used on {day2_label}: {room_names_in_mask(rooms_sorted, used_room_masks[date2])}")
+
+    for team_name, team_size, original_pref_labels in sorted_teams_for_pair:
+        if team_name in placed_teams_info:
+            continue
+    
+        print(f"  Trying to place {team_name} (size {team_size}) in {day1_label}/{day2_label}")
+    
+        chosen_room = assign_best_fit_room(
+            team_name, team_size, date1, date2,
+            rooms_sorted, room_capacities, room_bits, used_room_masks, placed_teams_info, rng
+        )
+        if chosen_room is None:
+            still_unplaced_from_this_pair.append((team_name, team_size, original_pref_labels))
+            print(f"    ❌ No available rooms for {team_name}")
+            continue
+        print(f"    ✅ Placed team {team_name} in {chosen_room.name} for {day1_label}/{day2_label}")
+
+    return still_unplaced_from_this_pair
+
+def place_by_augmenting_paths(unplaced_teams, placed_teams_info, teams_by_name, rooms_sorted, day_pairs):
+    """
+    Place leftover teams by moving already placed teams along augmenting paths.
+    
+    Teams are matched to (room, day pair) slots as in a bipartite matching: a
+    leftover team may take a slot whose current team can itself move to another
+    free or freeable slot. Slots on a team's preferred pair and smaller rooms are
+    tried first so moves stay as close to the greedy result as possible.
+    
+    Args:
+        unplaced_teams: (team_name, team_size, pref_labels) tuples without a room
+        placed_teams_info: team_name -> (room_name, date1, date2), updated in place
+        teams_by_name: team_name -> (team_name, team_size, pref_labels) for all teams
+        rooms_sorted: Rooms sorted by ascending capacity
+        day_pairs: (day1_label, day2_label, date1, date2) tuples teams may use
+    
+    Returns:
+        list: Teams from unplaced_teams that still could not be placed
+    """
+    slot_owner = {slot: team_name for team_name, slot in placed_teams_info.items()}
+
+    def candidate_slots(team_name):
+        _, team_size, pref_labels = teams_by_name[team_name]
+        ordered_pairs = sorted(day_pairs, key=lambda p: [p[0], p[1]] != pref_labels)
+        return [
+            (room.name, date1, date2)
+            for _, _, date1, date2 in ordered_pairs
+            for room in rooms_sorted
+            if room.capacity >= team_size
+        ]
+
+    def try_assign(team_name, visited):
+        slots = candidate_slots(team_name)
+        free_slot = next((slot for slot in slots if slot not in slot_owner), None)
+        if free_slot is not None:
+            slot_owner[free_slot] = team_name
+            placed_teams_info[team_name] = free_slot
+            return True
+        for slot in slots:
+            if slot in visited:
+                continue
+            visited.add(slot)
+            if try_assign(slot_owner[slot], visited):
+                slot_owner[slot] = team_name
+                placed_teams_info[team_name] = slot
+                return True
+        return False
+
+    still_unplaced = []
+    for team in unplaced_teams:
+        if not try_assign(team[0], set()):
+            still_unplaced.append(team)
+    return still_unplaced
+
+def run_allocation(database_url, only=None, base_monday_date=None, pool=None):
     """
     Run room allocation for a specific week.
     
+    The clear, the preference reads and the batched INSERT all run in one
+    transaction with a single commit at the end; any error rolls back the whole run.
+    
     Args:
         database_url: Database connection string
         only: "project" or "oasis" to run only that allocation, None for both
         base_monday_date: REQUIRED - Static Monday date to use (date object). No automatic date calculation.
+        pool: Optional psycopg2 connection pool to borrow the connection from (e.g. the app's
+            shared pool); defaults to a pool for database_url kept by this module
     
     Returns:
         tuple: (success: bool, messages: list)
@@ -49,6 +322,7 @@ def run_allocation(database_url, only=None, base_monday_date=None):
     
     try:
         day_mapping = get_day_mapping(base_monday_date)
+        rng = random.Random(get_week_seed(base_monday_date))
         print(f"Running allocation for week of {base_monday_date.strftime('%Y-%m-%d')} (Monday)")
         print(f"Day mapping: {day_mapping}")
     except ValueError as e:
@@ -57,362 +331,340 @@ def run_allocation(database_url, only=None, base_monday_date=None):
         return False, [error_msg]
     
     conn = None
-    cur = None
     unplaced_project_team_messages = []
+    # All weekly_allocations rows are buffered here and written in one batch before commit
+    pending_inserts = []
 
     try:
-        conn = psycopg2.connect(database_url)
-        cur = conn.cursor()
-
-        if only == "project":
-            # Only delete project allocations for the specific week
-            cur.execute("DELETE FROM weekly_allocations WHERE room_name != 'Oasis' AND date >= %s AND date <= %s", 
-                       (base_monday_date, base_monday_date + timedelta(days=6)))
-            print(f"Cleared project room allocations for week of {base_monday_date}")
-        elif only == "oasis":
-            cur.execute("SELECT COUNT(*) FROM oasis_preferences")
-            if cur.fetchone()[0] == 0:
-                print("No oasis preferences submitted. Skipping Oasis allocation.")
-                return True, ["No oasis preferences to allocate, so no changes made."]
-            # Only delete Oasis allocations for the specific week
-            cur.execute("DELETE FROM weekly_allocations WHERE room_name = 'Oasis' AND date >= %s AND date <= %s", 
-                       (base_monday_date, base_monday_date + timedelta(days=6)))
-            print(f"Cleared Oasis allocations for week of {base_monday_date}")
-        else:
-            # Delete all allocations for the specific week only
-            cur.execute("DELETE FROM weekly_allocations WHERE date >= %s AND date <= %s", 
-                       (base_monday_date, base_monday_date + timedelta(days=6)))
-            print(f"Cleared all allocations for week of {base_monday_date}")
-
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        rooms_file_path = os.path.join(base_dir, "rooms.json")
-        try:
-            with open(rooms_file_path, "r") as f:
-                all_rooms_config = json.load(f)
-        except FileNotFoundError:
-            return False, [f"CRITICAL ERROR: rooms.json not found at {rooms_file_path}"]
-        except json.JSONDecodeError:
-            return False, [f"CRITICAL ERROR: rooms.json at {rooms_file_path} is not valid JSON."]
-
-        project_rooms = [r for r in all_rooms_config if r.get("name") != "Oasis" and "capacity" in r and "name" in r]
-        oasis_config = next((r for r in all_rooms_config if r.get("name") == "Oasis" and "capacity" in r), None)
-
-        # Extract reserved rooms and non-reserved rooms
-        reserved_rooms = [r for r in project_rooms if "reserved_for" in r]
-        available_project_rooms = [r for r in project_rooms if "reserved_for" not in r]
-
-        if not project_rooms and only in [None, "project"]:
-            print("Warning: No project rooms defined in rooms.json or they are malformed.")
-        if not oasis_config and only in [None, "oasis"]:
-            print("Warning: Oasis room configuration not found or malformed in rooms.json. Using default if needed.")
-            oasis_config = {"name": "Oasis", "capacity": 15}
-
-        if only in [None, "project"]:
-            print("Starting project room allocation...")
+        if pool is None:
+            pool = _get_pool(database_url)
+        conn = pool.getconn()
+        # Everything below is one transaction: leaving the block commits, an exception rolls back
+        conn.autocommit = False
+        with conn, conn.cursor() as cur:
+            team_preferences_raw, person_rows = fetch_preferences(conn, only)
+
+            # The week is cleared in the same statement that writes the new rows (see below)
+            week_range = (base_monday_date, base_monday_date + timedelta(days=6))
+            if only == "project":
+                # Only delete project allocations for the specific week
+                clear_sql = "DELETE FROM weekly_allocations WHERE room_name != 'Oasis' AND date >= %s AND date <= %s"
+                clear_message = f"Cleared project room allocations for week of {base_monday_date}"
+            elif only == "oasis":
+                if not person_rows:
+                    print("No oasis preferences submitted. Skipping Oasis allocation.")
+                    return True, ["No oasis preferences to allocate, so no changes made."]
+                # Only delete Oasis allocations for the specific week
+                clear_sql = "DELETE FROM weekly_allocations WHERE room_name = 'Oasis' AND date >= %s AND date <= %s"
+                clear_message = f"Cleared Oasis allocations for week of {base_monday_date}"
+            else:
+                # Delete all allocations for the specific week only
+                clear_sql = "DELETE FROM weekly_allocations WHERE date >= %s AND date <= %s"
+                clear_message = f"Cleared all allocations for week of {base_monday_date}"
+
+            try:
+                project_rooms, oasis_config = _load_rooms()
+            except FileNotFoundError:
+                return False, [f"CRITICAL ERROR: rooms.json not found at {ROOMS_FILE}"]
+            except json.JSONDecodeError:
+                return False, [f"CRITICAL ERROR: rooms.json at {ROOMS_FILE} is not valid JSON."]
+
+            # Extract reserved rooms and non-reserved rooms
+            reserved_rooms = [r for r in project_rooms if r.reserved_for is not None]
+            available_project_rooms = [r for r in project_rooms if r.reserved_for is None]
+
+            if not project_rooms and only in [None, "project"]:
+                print("Warning: No project rooms defined in rooms.json or they are malformed.")
+            if not oasis_config and only in [None, "oasis"]:
+                print("Warning: Oasis room configuration not found or malformed in rooms.json. Using default if needed.")
+                oasis_config = {"name": "Oasis", "capacity": 15}
+
+            if only in [None, "project"]:
+                print("Starting project room allocation...")
             
-            # First, handle reserved rooms before processing normal team preferences
-            print("Processing reserved rooms...")
-            used_rooms_on_date = {date_obj: [] for date_obj in day_mapping.values()}
+                # First, handle reserved rooms before processing normal team preferences
+                print("Processing reserved rooms...")
+                rooms_sorted = available_project_rooms  # already sorted by capacity
+                room_capacities = [r.capacity for r in rooms_sorted]
+                # Bit i of used_room_masks[date] is set once rooms_sorted[i] is taken on that date.
+                # Reserved rooms are not in rooms_sorted, so they never need a bit.
+                room_bits = {r.name: 1 << idx for idx, r in enumerate(rooms_sorted)}
+                used_room_masks = {date_obj: 0 for date_obj in day_mapping.values()}
             
-            for reserved_room in reserved_rooms:
-                room_name = reserved_room["name"]
-                reserved_for = reserved_room["reserved_for"]
-                reserved_project = reserved_room.get("reserved_project", "Reserved Project")
-                reserved_until_str = reserved_room.get("reserved_until")
+                for reserved_room in reserved_rooms:
+                    room_name = reserved_room.name
+                    reserved_for = reserved_room.reserved_for
+                    reserved_project = reserved_room.reserved_project or "Reserved Project"
+                    reserved_until_str = reserved_room.reserved_until
                 
-                # Check if reservation is still valid
-                if reserved_until_str:
-                    try:
-                        reserved_until_date = datetime.strptime(reserved_until_str, "%Y-%m-%d").date()
-                        # Check if any day in the current week is before the expiration date
-                        week_end_date = max(day_mapping.values())
-                        if week_end_date > reserved_until_date:
-                            print(f"Skipping reservation for {room_name} - expired on {reserved_until_str}")
-                            continue
-                    except ValueError:
-                        print(f"Warning: Invalid reserved_until date format for {room_name}: {reserved_until_str}")
+                    # Check if reservation is still valid
+                    if reserved_until_str:
+                        try:
+                            reserved_until_date = datetime.strptime(reserved_until_str, "%Y-%m-%d").date()
+                            # Check if any day in the current week is before the expiration date
+                            week_end_date = day_mapping[DAY_LABELS[-1]]
+                            if week_end_date > reserved_until_date:
+                                print(f"Skipping reservation for {room_name} - expired on {reserved_until_str}")
+                                continue
+                        except ValueError:
+                            print(f"Warning: Invalid reserved_until date format for {room_name}: {reserved_until_str}")
                 
-                print(f"Reserving {room_name} for {reserved_for} on project {reserved_project}")
+                    print(f"Reserving {room_name} for {reserved_for} on project {reserved_project}")
                 
-                # Reserve for all weekdays (Monday through Friday)
-                for day_label, date_obj in day_mapping.items():
-                    team_name_display = f"{reserved_for} ({reserved_project})"
-                    cur.execute("INSERT INTO weekly_allocations (team_name, room_name, date) VALUES (%s, %s, %s)",
-                                (team_name_display, room_name, date_obj))
-                    used_rooms_on_date[date_obj].append(room_name)
-                    print(f"  → Reserved {room_name} for {team_name_display} on {day_label} ({date_obj})")
+                    # Reserve for all weekdays (Monday through Friday)
+                    for day_label, date_obj in day_mapping.items():
+                        team_name_display = f"{reserved_for} ({reserved_project})"
+                        pending_inserts.append((team_name_display, room_name, date_obj))
+                        print(f"  → Reserved {room_name} for {team_name_display} on {day_label} ({date_obj})")
             
-            # Now process normal team preferences
-            cur.execute("SELECT team_name, team_size, preferred_days FROM weekly_preferences")
-            team_preferences_raw = cur.fetchall()
-            print(f"Found {len(team_preferences_raw)} team preferences")
-
-            placed_teams_info = {}
-
-            teams_for_mon_wed = []
-            teams_for_tue_thu = []
-            teams_for_fallback_immediately = []
-
-            for team_name, team_size, preferred_days_str in team_preferences_raw:
-                pref_day_labels = [
-                    day.strip().capitalize() for day in preferred_days_str.split(',') if day.strip()
-                ]
-                team_data = (team_name, int(team_size), pref_day_labels)
-                print(f"Processing team {team_name}: raw='{preferred_days_str}' -> parsed={pref_day_labels}")
-
-                if pref_day_labels == ["Monday", "Wednesday"]:
-                    teams_for_mon_wed.append(team_data)
-                    print(f"  → Added to Monday/Wednesday group")
-                elif pref_day_labels == ["Tuesday", "Thursday"]:
-                    teams_for_tue_thu.append(team_data)
-                    print(f"  → Added to Tuesday/Thursday group")
-                else:
-                    teams_for_fallback_immediately.append(team_data)
-                    print(f"  → Added to immediate fallback group")
-
-            print(f"Teams preferring Mon/Wed: {len(teams_for_mon_wed)}")
-            print(f"Teams preferring Tue/Thu: {len(teams_for_tue_thu)}")
-            print(f"Teams with other preferences: {len(teams_for_fallback_immediately)}")
-
-            random.shuffle(teams_for_mon_wed)
-            random.shuffle(teams_for_tue_thu)
-            random.shuffle(teams_for_fallback_immediately)
-
-            def attempt_placement_for_pair(teams_list_for_pair, day1_label, day2_label):
-                nonlocal used_rooms_on_date, placed_teams_info
-                actual_date1 = day_mapping[day1_label]
-                actual_date2 = day_mapping[day2_label]
-                sorted_teams_for_pair = sorted(teams_list_for_pair, key=lambda x: x[1], reverse=True)
-                still_unplaced_from_this_pair = []
-
-                print(f"Attempting placement for {day1_label}/{day2_label} - {len(sorted_teams_for_pair)} teams")
-                print(f"  Teams to place: {[t[0] for t in sorted_teams_for_pair]}")
-                print(f"  Rooms already used on {day1_label}: {used_rooms_on_date[actual_date1]}")
-                print(f"  Rooms already used on {day2_label}: {used_rooms_on_date[actual_date2]}")
-
-                for team_name, team_size, original_pref_labels in sorted_teams_for_pair:
-                    if team_name in placed_teams_info:
-                        continue
-                    
-                    print(f"  Trying to place {team_name} (size {team_size}) in {day1_label}/{day2_label}")
-                    
-                    possible_rooms_for_team = [
-                        room_config for room_config in available_project_rooms
-                        if room_config["name"] not in used_rooms_on_date[actual_date1]
-                        and room_config["name"] not in used_rooms_on_date[actual_date2]
-                        and room_config["capacity"] >= team_size
-                    ]
-                    
-                    print(f"    Available rooms: {[r['name'] for r in possible_rooms_for_team]} (capacity >= {team_size})")
-                    
-                    if not possible_rooms_for_team:
-                        still_unplaced_from_this_pair.append((team_name, team_size, original_pref_labels))
-                        print(f"    ❌ No available rooms for {team_name}")
-                        continue
-                    min_suitable_capacity = min(r['capacity'] for r in possible_rooms_for_team)
-                    best_fit_candidate_rooms = [r for r in possible_rooms_for_team if r['capacity'] == min_suitable_capacity]
-                    random.shuffle(best_fit_candidate_rooms)
-                    chosen_room_config = best_fit_candidate_rooms[0]
-                    
-                    cur.execute("INSERT INTO weekly_allocations (team_name, room_name, date) VALUES (%s, %s, %s)",
-                                (team_name, chosen_room_config["name"], actual_date1))
-                    cur.execute("INSERT INTO weekly_allocations (team_name, room_name, date) VALUES (%s, %s, %s)",
-                                (team_name, chosen_room_config["name"], actual_date2))
-                    used_rooms_on_date[actual_date1].append(chosen_room_config["name"])
-                    used_rooms_on_date[actual_date2].append(chosen_room_config["name"])
-                    placed_teams_info[team_name] = [actual_date1, actual_date2]
-                    print(f"    ✅ Placed team {team_name} in {chosen_room_config['name']} for {day1_label}/{day2_label}")
-
-                return still_unplaced_from_this_pair
-
-            unplaced_after_mon_wed_pass = attempt_placement_for_pair(teams_for_mon_wed, "Monday", "Wednesday")
-            print(f"Unplaced after Mon/Wed pass: {[t[0] for t in unplaced_after_mon_wed_pass]}")
+                # Now process normal team preferences
+                print(f"Found {len(team_preferences_raw)} team preferences")
+
+                placed_teams_info = {}
+
+                teams_for_mon_wed = []
+                teams_for_tue_thu = []
+                teams_for_fallback_immediately = []
+                # team_name -> index of the valid day pair the team asked for, or None
+                preferred_pair_by_team = {}
+
+                for team_name, team_size, pref_day_labels in team_preferences_raw:
+                    team_data = (team_name, int(team_size), pref_day_labels)
+                    print(f"Processing team {team_name}: parsed={pref_day_labels}")
+
+                    preferred_pair = PROJECT_DAY_PAIR_INDEX.get(tuple(pref_day_labels))
+                    preferred_pair_by_team.setdefault(team_name, preferred_pair)
+                    if preferred_pair == 0:
+                        teams_for_mon_wed.append(team_data)
+                        print(f"  → Added to Monday/Wednesday group")
+                    elif preferred_pair == 1:
+                        teams_for_tue_thu.append(team_data)
+                        print(f"  → Added to Tuesday/Thursday group")
+                    else:
+                        teams_for_fallback_immediately.append(team_data)
+                        print(f"  → Added to immediate fallback group")
+
+                print(f"Teams preferring Mon/Wed: {len(teams_for_mon_wed)}")
+                print(f"Teams preferring Tue/Thu: {len(teams_for_tue_thu)}")
+                print(f"Teams with other preferences: {len(teams_for_fallback_immediately)}")
+
+                unplaced_after_mon_wed_pass = place_teams_on_pair(
+                    teams_for_mon_wed, "Monday", "Wednesday", day_mapping["Monday"], day_mapping["Wednesday"],
+                    rooms_sorted, room_capacities, room_bits, used_room_masks, placed_teams_info, rng
+                )
+                print(f"Unplaced after Mon/Wed pass: {[t[0] for t in unplaced_after_mon_wed_pass]}")
             
-            unplaced_after_tue_thu_pass = attempt_placement_for_pair(teams_for_tue_thu, "Tuesday", "Thursday")
-            print(f"Unplaced after Tue/Thu pass: {[t[0] for t in unplaced_after_tue_thu_pass]}")
+                unplaced_after_tue_thu_pass = place_teams_on_pair(
+                    teams_for_tue_thu, "Tuesday", "Thursday", day_mapping["Tuesday"], day_mapping["Thursday"],
+                    rooms_sorted, room_capacities, room_bits, used_room_masks, placed_teams_info, rng
+                )
+                print(f"Unplaced after Tue/Thu pass: {[t[0] for t in unplaced_after_tue_thu_pass]}")
             
-            # Log detailed results before fallback
-            print(f"After preferred placement phase:")
-            print(f"  - Monday/Wednesday teams placed: {len(teams_for_mon_wed) - len(unplaced_after_mon_wed_pass)}")
-            print(f"  - Tuesday/Thursday teams placed: {len(teams_for_tue_thu) - len(unplaced_after_tue_thu_pass)}")
-            print(f"  - Teams needing fallback: {len(unplaced_after_mon_wed_pass) + len(unplaced_after_tue_thu_pass) + len(teams_for_fallback_immediately)}")
+                # Log detailed results before fallback
+                print(f"After preferred placement phase:")
+                print(f"  - Monday/Wednesday teams placed: {len(teams_for_mon_wed) - len(unplaced_after_mon_wed_pass)}")
+                print(f"  - Tuesday/Thursday teams placed: {len(teams_for_tue_thu) - len(unplaced_after_tue_thu_pass)}")
+                print(f"  - Teams needing fallback: {len(unplaced_after_mon_wed_pass) + len(unplaced_after_tue_thu_pass) + len(teams_for_fallback_immediately)}")
             
-            master_fallback_pool = unplaced_after_mon_wed_pass + unplaced_after_tue_thu_pass + teams_for_fallback_immediately
-            random.shuffle(master_fallback_pool)
-
-            print(f"Fallback allocation needed for {len(master_fallback_pool)} teams")
+                # Drop already placed (or duplicate) teams once, before sorting
+                master_fallback_pool = list({
+                    team[0]: team
+                    for team in reversed(unplaced_after_mon_wed_pass + unplaced_after_tue_thu_pass + teams_for_fallback_immediately)
+                    if team[0] not in placed_teams_info
+                }.values())
+
+                print(f"Fallback allocation needed for {len(master_fallback_pool)} teams")
             
-            final_unplaced_project_teams = []
-            sorted_fallback_teams = sorted(master_fallback_pool, key=lambda x: x[1], reverse=True)
+                final_unplaced_project_teams = []
+                sorted_fallback_teams = sorted(master_fallback_pool, key=lambda x: (-x[1], rng.random()))
             
-            # Define the only valid day pairs for project teams
-            valid_day_pairs = [("Monday", "Wednesday"), ("Tuesday", "Thursday")]
+                # Define the only valid day pairs for project teams, resolved to dates once
+                mon_wed_pair, tue_thu_pair = [
+                    (day1_label, day2_label, day_mapping[day1_label], day_mapping[day2_label])
+                    for day1_label, day2_label in PROJECT_DAY_PAIRS
+                ]
+                valid_day_pairs = [mon_wed_pair, tue_thu_pair]
+                mon_wed_first_pairs = [mon_wed_pair, tue_thu_pair]
+                tue_thu_first_pairs = [tue_thu_pair, mon_wed_pair]
 
-            for team_name, team_size, original_pref_labels in sorted_fallback_teams:
-                if team_name in placed_teams_info:
-                    continue
-                
-                placed_in_fallback = False
+                for team_name, team_size, original_pref_labels in sorted_fallback_teams:
+                    placed_in_fallback = False
                 
-                print(f"Trying to place team {team_name} (preferred: {original_pref_labels}) in fallback...")
+                    print(f"Trying to place team {team_name} (preferred: {original_pref_labels}) in fallback...")
                 
-                # Determine fallback preference order based on original preference
-                # Keep original preference as first choice, then try the alternative
-                if original_pref_labels == ["Monday", "Wednesday"]:
-                    # If they preferred Mon/Wed, try Mon/Wed first, then Tue/Thu as fallback
-                    fallback_day_pairs = [("Monday", "Wednesday"), ("Tuesday", "Thursday")]
-                elif original_pref_labels == ["Tuesday", "Thursday"]:
-                    # If they preferred Tue/Thu, try Tue/Thu first, then Mon/Wed as fallback
-                    fallback_day_pairs = [("Tuesday", "Thursday"), ("Monday", "Wednesday")]
-                else:
-                    # For other preferences, try both valid pairs randomly
-                    fallback_day_pairs = valid_day_pairs.copy()
-                    random.shuffle(fallback_day_pairs)
-
-                for fb_day1_label, fb_day2_label in fallback_day_pairs:
-                    fb_actual_date1 = day_mapping[fb_day1_label]
-                    fb_actual_date2 = day_mapping[fb_day2_label]
-                    
-                    possible_rooms_for_fallback = [
-                        room_config for room_config in available_project_rooms
-                        if room_config["name"] not in used_rooms_on_date[fb_actual_date1]
-                        and room_config["name"] not in used_rooms_on_date[fb_actual_date2]
-                        and room_config["capacity"] >= team_size
-                    ]
-                    
-                    print(f"  Checking {fb_day1_label}/{fb_day2_label}: {len(possible_rooms_for_fallback)} available rooms (team size: {team_size})")
-                    
-                    if not possible_rooms_for_fallback:
+                    # A pair can only work if the biggest room still free on each of its days fits the team
+                    largest_free_by_date = {
+                        date_obj: largest_free_capacity(room_capacities, used_mask)
+                        for date_obj, used_mask in used_room_masks.items()
+                    }
+                    feasible_pairs = {
+                        (date1, date2) for _, _, date1, date2 in valid_day_pairs
+                        if team_size <= min(largest_free_by_date[date1], largest_free_by_date[date2])
+                    }
+                    if not feasible_pairs:
+                        # Nothing free is big enough on any pair, so there is nothing to search
+                        print(f"  Team size {team_size} exceeds the largest room still free on every day pair")
+                        final_unplaced_project_teams.append((team_name, team_size, original_pref_labels))
                         continue
-                    min_suitable_capacity_fb = min(r['capacity'] for r in possible_rooms_for_fallback)
-                    best_fit_candidate_rooms_fb = [r for r in possible_rooms_for_fallback if r['capacity'] == min_suitable_capacity_fb]
-                    random.shuffle(best_fit_candidate_rooms_fb)
-                    chosen_room_fb_config = best_fit_candidate_rooms_fb[0]
-                    
-                    cur.execute("INSERT INTO weekly_allocations (team_name, room_name, date) VALUES (%s, %s, %s)",
-                                (team_name, chosen_room_fb_config["name"], fb_actual_date1))
-                    cur.execute("INSERT INTO weekly_allocations (team_name, room_name, date) VALUES (%s, %s, %s)",
-                                (team_name, chosen_room_fb_config["name"], fb_actual_date2))
-                    used_rooms_on_date[fb_actual_date1].append(chosen_room_fb_config["name"])
-                    used_rooms_on_date[fb_actual_date2].append(chosen_room_fb_config["name"])
-                    
-                    placed_teams_info[team_name] = [fb_actual_date1, fb_actual_date2]
-                    placed_in_fallback = True
+                
+                    # Determine fallback preference order based on original preference
+                    # Keep original preference as first choice, then try the alternative
+                    preferred_pair = preferred_pair_by_team[team_name]
+                    if preferred_pair == 0:
+                        # If they preferred Mon/Wed, try Mon/Wed first, then Tue/Thu as fallback
+                        fallback_day_pairs = mon_wed_first_pairs
+                    elif preferred_pair == 1:
+                        # If they preferred Tue/Thu, try Tue/Thu first, then Mon/Wed as fallback
+                        fallback_day_pairs = tue_thu_first_pairs
+                    else:
+                        # For other preferences, try the pair with the most free rooms that fit first
+                        # (ties broken at random) so the teams still to come keep the most options
+                        fallback_day_pairs = max(
+                            (mon_wed_first_pairs, tue_thu_first_pairs),
+                            key=lambda pairs: (
+                                count_free_fitting_rooms(
+                                    room_capacities, team_size,
+                                    used_room_masks[pairs[0][2]] | used_room_masks[pairs[0][3]]
+                                ),
+                                rng.random()
+                            )
+                        )
+
+                    for fb_day1_label, fb_day2_label, fb_actual_date1, fb_actual_date2 in fallback_day_pairs:
+                        if (fb_actual_date1, fb_actual_date2) not in feasible_pairs:
+                            print(f"  Skipping {fb_day1_label}/{fb_day2_label}: no free room fits {team_size} on both days")
+                            continue
+                        print(f"  Checking {fb_day1_label}/{fb_day2_label} (team size: {team_size})")
+                        chosen_room_fb = assign_best_fit_room(
+                            team_name, team_size, fb_actual_date1, fb_actual_date2,
+                            rooms_sorted, room_capacities, room_bits, used_room_masks, placed_teams_info, rng
+                        )
+                        if chosen_room_fb is None:
+                            continue
+                        placed_in_fallback = True
                     
-                    # Enhanced logging to show if preference was honored or not
-                    preference_honored = (fb_day1_label, fb_day2_label) == (original_pref_labels[0], original_pref_labels[1]) if len(original_pref_labels) == 2 else False
-                    honor_status = "✓ PREFERENCE HONORED" if preference_honored else f"⚠ Fallback used (wanted {original_pref_labels})"
-                    print(f"  → Placed team {team_name} in {chosen_room_fb_config['name']} for {fb_day1_label}/{fb_day2_label} - {honor_status}")
-                    break
-
-                if not placed_in_fallback:
-                    final_unplaced_project_teams.append((team_name, team_size, original_pref_labels))
-
-            if final_unplaced_project_teams:
-                summary_message = f"--- Project Allocation: {len(final_unplaced_project_teams)} teams could not be placed. ---"
-                print(summary_message)
-                for team_name_unplaced, team_size_unplaced, original_pref_labels_unplaced in final_unplaced_project_teams:
-                    msg = f"Unplaced Project Team: {team_name_unplaced} (Size: {team_size_unplaced}, Preferred Days: {original_pref_labels_unplaced})"
-                    print(f"  {msg}")
-                    unplaced_project_team_messages.append(msg)
-            else:
-                print("--- Project Allocation: All project teams were successfully placed. ---")
+                        # Enhanced logging to show if preference was honored or not
+                        preference_honored = (fb_day1_label, fb_day2_label) == (original_pref_labels[0], original_pref_labels[1]) if len(original_pref_labels) == 2 else False
+                        honor_status = "✓ PREFERENCE HONORED" if preference_honored else f"⚠ Fallback used (wanted {original_pref_labels})"
+                        print(f"  → Placed team {team_name} in {chosen_room_fb.name} for {fb_day1_label}/{fb_day2_label} - {honor_status}")
+                        break
+
+                    if not placed_in_fallback:
+                        final_unplaced_project_teams.append((team_name, team_size, original_pref_labels))
+
+                if final_unplaced_project_teams:
+                    # Greedy best-fit can strand a team even when a full assignment exists;
+                    # rearrange placed teams where that frees a slot for the leftovers.
+                    teams_by_name = {
+                        team[0]: team for team in teams_for_mon_wed + teams_for_tue_thu + teams_for_fallback_immediately
+                    }
+                    placements_before_repair = dict(placed_teams_info)
+                    final_unplaced_project_teams = place_by_augmenting_paths(
+                        final_unplaced_project_teams, placed_teams_info, teams_by_name, rooms_sorted, valid_day_pairs
+                    )
+                    for team_name, slot in placed_teams_info.items():
+                        if team_name not in placements_before_repair:
+                            print(f"  → Placed team {team_name} in {slot[0]} on {slot[1]}/{slot[2]} after rearranging")
+                        elif placements_before_repair[team_name] != slot:
+                            print(f"  → Moved team {team_name} to {slot[0]} on {slot[1]}/{slot[2]} to make room")
+
+                for team_name, (room_name, date1, date2) in placed_teams_info.items():
+                    pending_inserts.append((team_name, room_name, date1))
+                    pending_inserts.append((team_name, room_name, date2))
+
+                if final_unplaced_project_teams:
+                    summary_message = f"--- Project Allocation: {len(final_unplaced_project_teams)} teams could not be placed. ---"
+                    print(summary_message)
+                    for team_name_unplaced, team_size_unplaced, original_pref_labels_unplaced in final_unplaced_project_teams:
+                        msg = f"Unplaced Project Team: {team_name_unplaced} (Size: {team_size_unplaced}, Preferred Days: {original_pref_labels_unplaced})"
+                        print(f"  {msg}")
+                        unplaced_project_team_messages.append(msg)
+                else:
+                    print("--- Project Allocation: All project teams were successfully placed. ---")
 
-        if only in [None, "oasis"]:
-            print("Starting Oasis allocation...")
-            if not oasis_config:
-                print("Error: Oasis configuration missing or malformed, cannot perform Oasis allocation.")
-            else:
-                cur.execute("SELECT person_name, preferred_day_1, preferred_day_2, preferred_day_3, preferred_day_4, preferred_day_5 FROM oasis_preferences")
-                person_rows = cur.fetchall()
-                print(f"Found {len(person_rows)} Oasis preferences")
-                
-                if not person_rows:
-                    print("No Oasis preferences found for allocation.")
+            if only in [None, "oasis"]:
+                print("Starting Oasis allocation...")
+                if not oasis_config:
+                    print("Error: Oasis configuration missing or malformed, cannot perform Oasis allocation.")
                 else:
-                    oasis_allocations_on_actual_date = {date_obj: set() for date_obj in day_mapping.values()}
-                    person_assigned_days = {row[0]: 0 for row in person_rows}
-                    person_preferences = {}
-                    day_to_people = {day: [] for day in day_mapping}
-
-                    # Parse preferences
-                    for person_name, d1, d2, d3, d4, d5 in person_rows:
-                        prefs = [
-                            day.strip().capitalize() for day in [d1, d2, d3, d4, d5]
-                            if day and day.strip().capitalize() in day_mapping
-                        ]
-                        person_preferences[person_name] = prefs
-                        for day in prefs:
-                            day_to_people[day].append(person_name)
-                        print(f"Person {person_name} prefers: {prefs}")
-
-                    # First pass: Give everyone at least one day (priority to those with 0 assignments)
-                    for day_label, date_obj in day_mapping.items():
-                        candidates = [p for p in day_to_people[day_label] if person_assigned_days[p] == 0]
-                        random.shuffle(candidates)
-                        for person_name in candidates:
-                            if len(oasis_allocations_on_actual_date[date_obj]) < oasis_config["capacity"]:
-                                cur.execute("INSERT INTO weekly_allocations (team_name, room_name, date) VALUES (%s, %s, %s)",
-                                            (person_name, oasis_config["name"], date_obj))
-                                oasis_allocations_on_actual_date[date_obj].add(person_name)
-                                person_assigned_days[person_name] += 1
-                                print(f"First pass: Assigned {person_name} to {day_label} ({date_obj})")
-
-                    # Additional passes: Fill remaining spots
-                    still_assignable = True
-                    pass_number = 2
-                    while still_assignable:
-                        still_assignable = False
-                        all_people = list(person_preferences.keys())
-                        random.shuffle(all_people)
-
-                        print(f"Oasis allocation pass {pass_number}")
-                        for person_name in all_people:
-                            if person_assigned_days[person_name] >= len(person_preferences[person_name]):
-                                continue  # Person has been assigned to all their preferred days
-                            
-                            for day_label in person_preferences[person_name]:
-                                date_obj = day_mapping[day_label]
-                                if person_name in oasis_allocations_on_actual_date[date_obj]:
-                                    continue  # Person already assigned to this day
-                                
-                                if len(oasis_allocations_on_actual_date[date_obj]) < oasis_config["capacity"]:
-                                    cur.execute("INSERT INTO weekly_allocations (team_name, room_name, date) VALUES (%s, %s, %s)",
-                                                (person_name, oasis_config["name"], date_obj))
-                                    oasis_allocations_on_actual_date[date_obj].add(person_name)
-                                    person_assigned_days[person_name] += 1
-                                    still_assignable = True
-                                    print(f"Pass {pass_number}: Assigned {person_name} to {day_label} ({date_obj})")
+                    print(f"Found {len(person_rows)} Oasis preferences")
+                
+                    if not person_rows:
+                        print("No Oasis preferences found for allocation.")
+                    else:
+                        oasis_name = oasis_config["name"]
+                        oasis_capacity = oasis_config["capacity"]
+                        oasis_counts = {date_obj: 0 for date_obj in day_mapping.values()}
+                        person_day_counts = {row[0]: 0 for row in person_rows}
+                        person_preferences = {}
+
+                        # Parse preferences
+                        for person_name, d1, d2, d3, d4, d5 in person_rows:
+                            # dict.fromkeys drops a day listed twice, so every (person, day) pair is unique
+                            prefs = list(dict.fromkeys(
+                                day for day in (raw_day.strip().capitalize() for raw_day in (d1, d2, d3, d4, d5) if raw_day)
+                                if day in day_mapping
+                            ))
+                            # Resolve labels to dates once so the rounds below don't look them up again
+                            person_preferences[person_name] = [(day, day_mapping[day]) for day in prefs]
+                            print(f"Person {person_name} prefers: {prefs}")
+
+                        # Round-robin over people in a random order: each turn gives a person their next
+                        # preferred day that still has room, so everyone gets one day before anyone gets a
+                        # second. Full days stay full, so each person's preference iterator only moves forward.
+                        people_in_order = list(person_preferences)
+                        rng.shuffle(people_in_order)
+                        remaining = deque((person_name, iter(person_preferences[person_name])) for person_name in people_in_order)
+                        while remaining:
+                            person_name, prefs_left = remaining.popleft()
+                            for day_label, date_obj in prefs_left:
+                                if oasis_counts[date_obj] < oasis_capacity:
+                                    pending_inserts.append((person_name, oasis_name, date_obj))
+                                    oasis_counts[date_obj] += 1
+                                    person_day_counts[person_name] += 1
+                                    print(f"Round {person_day_counts[person_name]}: Assigned {person_name} to {day_label} ({date_obj})")
+                                    remaining.append((person_name, prefs_left))
                                     break
-                        pass_number += 1
 
-                    # Print final Oasis summary
-                    print("Final Oasis allocation summary:")
-                    for day_label, date_obj in day_mapping.items():
-                        assigned_count = len(oasis_allocations_on_actual_date[date_obj])
-                        available_spots = oasis_config["capacity"] - assigned_count
-                        print(f"  {day_label} ({date_obj}): {assigned_count}/{oasis_config['capacity']} assigned, {available_spots} spots available")
+                        # Print final Oasis summary
+                        print("Final Oasis allocation summary:")
+                        for day_label, date_obj in day_mapping.items():
+                            assigned_count = oasis_counts[date_obj]
+                            available_spots = oasis_capacity - assigned_count
+                            print(f"  {day_label} ({date_obj}): {assigned_count}/{oasis_capacity} assigned, {available_spots} spots available")
+
+            # Clear and insert in one round trip: the DELETE runs as a data-modifying CTE,
+            # which only sees rows from before this statement, so new rows are never removed
+            clear_sql = cur.mogrify(clear_sql, week_range).decode()
+            # The allocation is fully derived from the stored preferences and can simply be
+            # re-run, so the single commit does not need to wait for the WAL flush
+            write_prefix = "SET LOCAL synchronous_commit = OFF; "
+            if pending_inserts:
+                psycopg2.extras.execute_values(
+                    cur,
+                    f"{write_prefix}WITH cleared AS ({clear_sql}) INSERT INTO weekly_allocations (team_name, room_name, date) VALUES %s",
+                    pending_inserts,
+                    page_size=len(pending_inserts)
+                )
+                print(clear_message)
+                print(f"Inserted {len(pending_inserts)} allocation rows")
+            else:
+                cur.execute(write_prefix + clear_sql)
+                print(clear_message)
 
-        conn.commit()
         print(f"Allocation completed successfully for week of {base_monday_date}")
         return True, unplaced_project_team_messages
 
     except psycopg2.Error as db_err:
         error_msg = f"Database error during allocation: {db_err}"
         print(error_msg)
-        if conn:
-            conn.rollback()
         return False, [error_msg]
     except Exception as e:
         error_msg = f"General error during allocation: {type(e).__name__} - {e}"
         print(error_msg)
         import traceback
         traceback.print_exc()
-        if conn:
-            conn.rollback()
         return False, [error_msg]
     finally:
-        if cur:
-            cur.close()
         if conn:
-            conn.close()
\ No newline at end of file
+            pool.putconn(conn)
\ No newline at end of file
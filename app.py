@@ -3,10 +3,13 @@ import psycopg2
 import psycopg2.pool
 import json
 import os
-from datetime import datetime, timedelta, date
-import pytz
+import functools
+import hmac
+from contextlib import contextmanager
+from datetime import datetime, timedelta, date, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import pandas as pd
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 from allocate_rooms import run_allocation  # Assuming this file exists and is correct
 
 # -----------------------------------------------------
@@ -16,23 +19,39 @@ st.set_page_config(page_title="Weekly Room Allocator - TS", layout="wide")
 
 DATABASE_URL = st.secrets.get("SUPABASE_DB_URI", os.environ.get("SUPABASE_DB_URI"))
 OFFICE_TIMEZONE_STR = st.secrets.get("OFFICE_TIMEZONE", os.environ.get("OFFICE_TIMEZONE", "UTC"))
+# Upper bound per Streamlit process; lower it when running several processes against one database
+DB_POOL_MAX = int(st.secrets.get("DB_POOL_MAX", os.environ.get("DB_POOL_MAX", 25)))
 RESET_PASSWORD = "boom123"  # Consider moving to secrets
 
-try:
-    OFFICE_TIMEZONE = pytz.timezone(OFFICE_TIMEZONE_STR)
-except pytz.UnknownTimeZoneError:
+@functools.lru_cache(maxsize=4)
+def get_timezone(name):
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+OFFICE_TIMEZONE = get_timezone(OFFICE_TIMEZONE_STR)
+if OFFICE_TIMEZONE is None:
     st.error(f"Invalid Timezone: '{OFFICE_TIMEZONE_STR}', defaulting to UTC.")
-    OFFICE_TIMEZONE = pytz.utc
+    OFFICE_TIMEZONE = timezone.utc
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ROOMS_FILE = os.path.join(BASE_DIR, 'rooms.json')
-try:
+
+@st.cache_data
+def load_rooms():
+    # Parsed once per process; failures raise and are therefore not cached.
     with open(ROOMS_FILE, 'r') as f:
-        AVAILABLE_ROOMS = json.load(f)
+        rooms = json.load(f)
+    return rooms, {r["name"]: r for r in rooms}
+
+try:
+    AVAILABLE_ROOMS, ROOMS_BY_NAME = load_rooms()
 except FileNotFoundError:
     st.error(f"Error: {ROOMS_FILE} not found. Please ensure it exists in the application directory.")
-    AVAILABLE_ROOMS = []
-oasis = next((r for r in AVAILABLE_ROOMS if r["name"] == "Oasis"), {"capacity": 12})
+    AVAILABLE_ROOMS, ROOMS_BY_NAME = [], {}
+oasis = ROOMS_BY_NAME.get("Oasis", {"capacity": 12})
+PROJECT_ROOMS = [r["name"] for r in AVAILABLE_ROOMS if r["name"] != "Oasis"]
 
 # -----------------------------------------------------
 # STATIC DATE CONFIGURATION - EDIT THESE VALUES MANUALLY
@@ -49,15 +68,44 @@ def get_db_connection_pool():
     if not DATABASE_URL:
         st.error("Database URL is not configured. Please set SUPABASE_DB_URI.")
         return None
-    return psycopg2.pool.SimpleConnectionPool(1, 25, dsn=DATABASE_URL)
+    # Streamlit serves sessions from several threads, so the pool must be thread-safe.
+    # Point SUPABASE_DB_URI at Supabase's transaction pooler (port 6543) so these
+    # connections are multiplexed instead of each holding a Postgres backend.
+    # TCP keepalives stop idle pooled connections from being dropped silently between reruns.
+    return psycopg2.pool.ThreadedConnectionPool(
+        2, DB_POOL_MAX, dsn=DATABASE_URL, application_name="room_allocator",
+        keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3
+    )
+
+# Prefix for the first statement of each write transaction, so a hung write or an abandoned transaction
+# cannot pin a pool slot. SET LOCAL (not SET) because the 6543 transaction pooler hands each transaction
+# to any backend; it travels in the same execute as the write, so it costs no extra round trip.
+TRANSACTION_LIMITS_SQL = "SET LOCAL statement_timeout = '5s'; SET LOCAL idle_in_transaction_session_timeout = '10s'; "
+
+# Serializes Oasis sign-ups per day until commit, so two concurrent count-then-insert checks
+# cannot both take the last free seat (dates sorted so overlapping sign-ups lock in the same order)
+OASIS_DAY_LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext('oasis_day:' || day::text)) FROM unnest(%(dates)s::date[]) AS day ORDER BY day; "
 
 def get_connection(pool):
-    if pool: return pool.getconn()
-    return None
+    if not pool: return None
+    return pool.getconn()
 
 def return_connection(pool, conn):
     if pool and conn: pool.putconn(conn)
 
+@contextmanager
+def borrow_connection(pool):
+    """Borrow a pooled connection: roll back if the block raises, always hand it back."""
+    if not pool: raise psycopg2.OperationalError("No DB Connection")
+    conn = get_connection(pool)
+    try:
+        yield conn
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+
 pool = get_db_connection_pool()
 
 # -----------------------------------------------------
@@ -147,79 +195,108 @@ admin_settings = load_admin_settings()
 # -----------------------------------------------------
 # Initialize session state with database values
 # -----------------------------------------------------
-if "project_rooms_display_monday" not in st.session_state:
-    st.session_state.project_rooms_display_monday = STATIC_PROJECT_MONDAY
-if "oasis_display_monday" not in st.session_state:
-    st.session_state.oasis_display_monday = STATIC_OASIS_MONDAY
+st.session_state.setdefault("project_rooms_display_monday", STATIC_PROJECT_MONDAY)
+st.session_state.setdefault("oasis_display_monday", STATIC_OASIS_MONDAY)
 
 # -----------------------------------------------------
 # Database Utility Functions
 # -----------------------------------------------------
-def get_room_grid(pool, display_monday: date):
-    if not pool: return pd.DataFrame()
+@st.cache_data(ttl=300, show_spinner=False)
+def has_confirmed_column(_pool):
+    """Check whether weekly_allocations has the confirmed column (see backup_tables.sql), re-probed every 5 minutes"""
+    if not _pool: return False
+    conn = get_connection(_pool)
+    if not conn: return False
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM information_schema.columns WHERE table_name = 'weekly_allocations' AND column_name = 'confirmed'")
+            return cur.fetchone() is not None
+    finally:
+        return_connection(_pool, conn)
+
+# Read caches below are dropped (fetch_*.clear()) after every successful write to the tables they read.
+# Streamlit keys caches per module, so writes on other pages reach these within the 60s TTL.
+# They raise on database errors (st.cache_data never caches an exception); the get_* wrappers
+# further down report the failure and return None, so a fallback frame is never cached or saved.
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_room_grid(_pool, display_monday: date):
+    if not _pool: return pd.DataFrame()
     this_monday = display_monday
     day_mapping = {
         this_monday + timedelta(days=0): "Monday", this_monday + timedelta(days=1): "Tuesday",
         this_monday + timedelta(days=2): "Wednesday", this_monday + timedelta(days=3): "Thursday"
     }
     day_labels = list(day_mapping.values())
+    if not PROJECT_ROOMS: return pd.DataFrame()
+    grid = {room: {**{"Room": room}, **{day: "Vacant" for day in day_labels}} for room in PROJECT_ROOMS}
+    # The connection goes back to the pool as soon as the rows are fetched
+    with borrow_connection(_pool) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        start_date, end_date = this_monday, this_monday + timedelta(days=3) 
+        # Contacts come along in the same round trip
+        cur.execute("""
+            SELECT a.team_name, a.room_name, a.date, p.contact_person
+            FROM weekly_allocations a
+            LEFT JOIN weekly_preferences p ON p.team_name = a.team_name
+            WHERE a.room_name != 'Oasis' AND a.date >= %s AND a.date <= %s
+        """, (start_date, end_date))
+        allocations = cur.fetchall()
+    for row in allocations:
+        team, room, date_val = row["team_name"], row["room_name"], row["date"]
+        day = day_mapping.get(date_val)
+        if room not in grid or not day: continue
+        contact = row["contact_person"]
+        grid[room][day] = f"{team} ({contact})" if contact else team
+    return pd.DataFrame(grid.values())
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_preferences(_pool):
+    if not _pool: return pd.DataFrame()
+    with borrow_connection(_pool) as conn, conn.cursor() as cur:
+        # Display names are SQL aliases, so the DataFrame columns follow the query, not positions
+        cur.execute(
+            'SELECT team_name AS "Team", contact_person AS "Contact", team_size AS "Size", '
+            'preferred_days AS "Days", submission_time AS "Submitted At" '
+            "FROM weekly_preferences ORDER BY submission_time DESC"
+        )
+        rows, columns = cur.fetchall(), [col.name for col in cur.description]
+    return pd.DataFrame(rows, columns=columns)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_oasis_preferences(_pool):
+    if not _pool: return pd.DataFrame()
+    with borrow_connection(_pool) as conn, conn.cursor() as cur:
+        cur.execute(
+            'SELECT person_name AS "Person", preferred_day_1 AS "Day 1", preferred_day_2 AS "Day 2", '
+            'preferred_day_3 AS "Day 3", preferred_day_4 AS "Day 4", preferred_day_5 AS "Day 5", '
+            'submission_time AS "Submitted At" '
+            "FROM oasis_preferences ORDER BY submission_time DESC"
+        )
+        rows, columns = cur.fetchall(), [col.name for col in cur.description]
+    return pd.DataFrame(rows, columns=columns)
+
+def get_room_grid(pool, display_monday: date):
+    """Project room grid for the week, or None (after a warning) if it could not be loaded"""
     try:
-        with open(ROOMS_FILE) as f: all_rooms = [r["name"] for r in json.load(f) if r["name"] != "Oasis"]
-    except (FileNotFoundError, json.JSONDecodeError):
-        st.error(f"Error: Could not load valid data from {ROOMS_FILE}.")
-        return pd.DataFrame()
-    grid = {room: {**{"Room": room}, **{day: "Vacant" for day in day_labels}} for room in all_rooms}
-    conn = get_connection(pool)
-    if not conn: return pd.DataFrame(grid.values())
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            start_date, end_date = this_monday, this_monday + timedelta(days=3) 
-            cur.execute("""
-                SELECT team_name, room_name, date FROM weekly_allocations
-                WHERE room_name != 'Oasis' AND date >= %s AND date <= %s
-            """, (start_date, end_date))
-            allocations = cur.fetchall()
-            cur.execute("SELECT team_name, contact_person FROM weekly_preferences") 
-            contacts = {row["team_name"]: row["contact_person"] for row in cur.fetchall()}
-        for row in allocations:
-            team, room, date_val = row["team_name"], row["room_name"], row["date"]
-            day = day_mapping.get(date_val)
-            if room not in grid or not day: continue
-            contact = contacts.get(team)
-            grid[room][day] = f"{team} ({contact})" if contact else team
-        return pd.DataFrame(grid.values())
-    except psycopg2.Error as e:
+        return fetch_room_grid(pool, display_monday)
+    except Exception as e:
         st.warning(f"Database error while getting room grid: {e}")
-        return pd.DataFrame(grid.values())
-    finally: return_connection(pool, conn)
+        return None
 
 def get_preferences(pool):
-    if not pool: return pd.DataFrame()
-    conn = get_connection(pool)
-    if not conn: return pd.DataFrame()
+    """Team preferences, or None (after a warning) if they could not be loaded"""
     try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT team_name, contact_person, team_size, preferred_days, submission_time FROM weekly_preferences ORDER BY submission_time DESC")
-            rows = cur.fetchall()
-            return pd.DataFrame(rows, columns=["Team", "Contact", "Size", "Days", "Submitted At"])
+        return fetch_preferences(pool)
     except Exception as e:
         st.warning(f"Failed to fetch preferences: {e}")
-        return pd.DataFrame()
-    finally: return_connection(pool, conn)
+        return None
 
 def get_oasis_preferences(pool):
-    if not pool: return pd.DataFrame()
-    conn = get_connection(pool)
-    if not conn: return pd.DataFrame()
+    """Oasis preferences, or None (after a warning) if they could not be loaded"""
     try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT person_name, preferred_day_1, preferred_day_2, preferred_day_3, preferred_day_4, preferred_day_5, submission_time FROM oasis_preferences ORDER BY submission_time DESC")
-            rows = cur.fetchall()
-            return pd.DataFrame(rows, columns=["Person", "Day 1", "Day 2", "Day 3", "Day 4", "Day 5", "Submitted At"])
+        return fetch_oasis_preferences(pool)
     except Exception as e:
         st.warning(f"Failed to fetch oasis preferences: {e}")
-        return pd.DataFrame()
-    finally: return_connection(pool, conn)
+        return None
 
 # -----------------------------------------------------
 # Insert / Update Functions
@@ -232,30 +309,114 @@ def insert_preference(pool, team, contact, size, days):
     if not 3 <= size <= 6: 
         st.error("❌ Team size must be between 3 and 6.")
         return False
-    conn = get_connection(pool)
-    if not conn: return False
+    new_days_set = set(days.split(','))
+    valid_pairs = [set(["Monday", "Wednesday"]), set(["Tuesday", "Thursday"])]
+    if new_days_set not in valid_pairs:
+        st.error("❌ Invalid day selection. Must select Monday & Wednesday or Tuesday & Thursday.")
+        return False
     try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT 1 FROM weekly_preferences WHERE team_name = %s", (team,))
-            if cur.fetchone():
-                st.error(f"❌ Team '{team}' has already submitted a preference. Contact admin to change.")
-                return False
-            new_days_set = set(days.split(','))
-            valid_pairs = [set(["Monday", "Wednesday"]), set(["Tuesday", "Thursday"])]
-            if new_days_set not in valid_pairs:
-                st.error("❌ Invalid day selection. Must select Monday & Wednesday or Tuesday & Thursday.")
-                return False
+        with borrow_connection(pool) as conn, conn.cursor() as cur:
+            # Insert only if the team has not submitted yet; no row back means it already has.
+            # With the unique index from unique_preference_indexes.sql, ON CONFLICT also covers concurrent submits.
             cur.execute(
-                "INSERT INTO weekly_preferences (team_name, contact_person, team_size, preferred_days, submission_time) VALUES (%s, %s, %s, %s, NOW() AT TIME ZONE 'UTC')",
-                (team, contact, size, days)
+                TRANSACTION_LIMITS_SQL +
+                "INSERT INTO weekly_preferences (team_name, contact_person, team_size, preferred_days, submission_time) "
+                "SELECT %(team)s, %(contact)s, %(size)s, %(days)s, NOW() AT TIME ZONE 'UTC' "
+                "WHERE NOT EXISTS (SELECT 1 FROM weekly_preferences WHERE team_name = %(team)s) "
+                "ON CONFLICT DO NOTHING RETURNING 1",
+                {"team": team, "contact": contact, "size": size, "days": days}
             )
+            if cur.fetchone() is None:
+                conn.rollback()
+                st.error(f"❌ Team '{team}' has already submitted a preference. Contact admin to change.")
+                return False
             conn.commit()
+            fetch_preferences.clear()
             return True
     except psycopg2.Error as e:
         st.error(f"Database insert failed: {e}")
-        conn.rollback()
         return False
-    finally: return_connection(pool, conn)
+
+def to_naive_utc(value, default):
+    """submission_time as a naive UTC datetime, like the TIMESTAMP column stores it; empty cells become default"""
+    if value is None or pd.isna(value): return default
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None: ts = ts.tz_convert("UTC").tz_localize(None)
+    return ts.to_pydatetime()
+
+def sync_preferences(cur, rows):
+    """Make weekly_preferences match (team, contact, size, days, submitted_at) rows, writing only changed teams"""
+    if not rows:
+        cur.execute(TRANSACTION_LIMITS_SQL + "DELETE FROM weekly_preferences")
+        return
+    # One statement for the whole batch (page_size), otherwise each page would delete the previous one's teams
+    execute_values(cur, TRANSACTION_LIMITS_SQL + """
+        WITH edited (team_name, contact_person, team_size, preferred_days, submission_time) AS (VALUES %s),
+        removed AS (
+            DELETE FROM weekly_preferences p
+            WHERE NOT EXISTS (SELECT 1 FROM edited e WHERE e.team_name = p.team_name)
+        ),
+        changed AS (
+            UPDATE weekly_preferences p
+            SET contact_person = e.contact_person, team_size = e.team_size,
+                preferred_days = e.preferred_days, submission_time = e.submission_time
+            FROM edited e
+            WHERE p.team_name = e.team_name
+              AND (p.contact_person, p.team_size, p.preferred_days, p.submission_time)
+                  IS DISTINCT FROM (e.contact_person, e.team_size, e.preferred_days, e.submission_time)
+        )
+        INSERT INTO weekly_preferences (team_name, contact_person, team_size, preferred_days, submission_time)
+        SELECT * FROM edited e
+        WHERE NOT EXISTS (SELECT 1 FROM weekly_preferences p WHERE p.team_name = e.team_name)
+    """, rows, page_size=len(rows))
+
+def sync_oasis_preferences(cur, rows):
+    """Make oasis_preferences match (person, day 1..5, submitted_at) rows, writing only changed people"""
+    if not rows:
+        cur.execute(TRANSACTION_LIMITS_SQL + "DELETE FROM oasis_preferences")
+        return
+    execute_values(cur, TRANSACTION_LIMITS_SQL + """
+        WITH edited (person_name, preferred_day_1, preferred_day_2, preferred_day_3,
+                     preferred_day_4, preferred_day_5, submission_time) AS (VALUES %s),
+        removed AS (
+            DELETE FROM oasis_preferences p
+            WHERE NOT EXISTS (SELECT 1 FROM edited e WHERE e.person_name = p.person_name)
+        ),
+        changed AS (
+            UPDATE oasis_preferences p
+            SET preferred_day_1 = e.preferred_day_1, preferred_day_2 = e.preferred_day_2,
+                preferred_day_3 = e.preferred_day_3, preferred_day_4 = e.preferred_day_4,
+                preferred_day_5 = e.preferred_day_5, submission_time = e.submission_time
+            FROM edited e
+            WHERE p.person_name = e.person_name
+              AND (p.preferred_day_1, p.preferred_day_2, p.preferred_day_3, p.preferred_day_4,
+                   p.preferred_day_5, p.submission_time)
+                  IS DISTINCT FROM (e.preferred_day_1, e.preferred_day_2, e.preferred_day_3, e.preferred_day_4,
+                                    e.preferred_day_5, e.submission_time)
+        )
+        INSERT INTO oasis_preferences (person_name, preferred_day_1, preferred_day_2, preferred_day_3,
+                                       preferred_day_4, preferred_day_5, submission_time)
+        SELECT * FROM edited e
+        WHERE NOT EXISTS (SELECT 1 FROM oasis_preferences p WHERE p.person_name = e.person_name)
+    """, rows, page_size=len(rows))
+
+def sync_project_allocations(cur, week_monday, rows):
+    """Make the week's project allocations match (team, room, date) rows, writing only changed cells"""
+    week_end = week_monday + timedelta(days=3)
+    # Drop the week's rows that are no longer in the grid; arrays keep this to one statement
+    cur.execute(TRANSACTION_LIMITS_SQL + """
+        DELETE FROM weekly_allocations a
+        WHERE a.room_name != 'Oasis' AND a.date >= %s AND a.date <= %s
+          AND (a.team_name, a.room_name, a.date) NOT IN (
+              SELECT * FROM unnest(%s::text[], %s::text[], %s::date[]))
+    """, (week_monday, week_end, [r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows]))
+    if rows:
+        execute_values(cur, """
+            INSERT INTO weekly_allocations (team_name, room_name, date)
+            SELECT e.team_name, e.room_name, e.date::date FROM (VALUES %s) AS e (team_name, room_name, date)
+            WHERE NOT EXISTS (SELECT 1 FROM weekly_allocations a
+                              WHERE a.team_name = e.team_name AND a.room_name = e.room_name AND a.date = e.date::date)
+        """, rows, page_size=len(rows))
 
 def insert_oasis(pool, person, selected_days):
     if not pool: return False
@@ -265,26 +426,29 @@ def insert_oasis(pool, person, selected_days):
     if not 0 < len(selected_days) <= 5:
         st.error("❌ Select between 1 and 5 preferred days.")
         return False
-    conn = get_connection(pool)
-    if not conn: return False
     try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT 1 FROM oasis_preferences WHERE person_name = %s", (person,))
-            if cur.fetchone():
-                st.error("❌ You've already submitted. Contact admin to change your selection.")
-                return False
+        with borrow_connection(pool) as conn, conn.cursor() as cur:
             padded_days = selected_days + [None] * (5 - len(selected_days))
+            # Insert only if this person has not submitted yet; no row back means they already have.
+            # With the unique index from unique_preference_indexes.sql, ON CONFLICT also covers concurrent submits.
             cur.execute(
-                "INSERT INTO oasis_preferences (person_name, preferred_day_1, preferred_day_2, preferred_day_3, preferred_day_4, preferred_day_5, submission_time) VALUES (%s, %s, %s, %s, %s, %s, NOW() AT TIME ZONE 'UTC')",
-                (person.strip(), *padded_days)
+                TRANSACTION_LIMITS_SQL +
+                "INSERT INTO oasis_preferences (person_name, preferred_day_1, preferred_day_2, preferred_day_3, preferred_day_4, preferred_day_5, submission_time) "
+                "SELECT %s, %s, %s, %s, %s, %s, NOW() AT TIME ZONE 'UTC' "
+                "WHERE NOT EXISTS (SELECT 1 FROM oasis_preferences WHERE person_name = %s) "
+                "ON CONFLICT DO NOTHING RETURNING 1",
+                (person.strip(), *padded_days, person)
             )
+            if cur.fetchone() is None:
+                conn.rollback()
+                st.error("❌ You've already submitted. Contact admin to change your selection.")
+                return False
             conn.commit()
+            fetch_oasis_preferences.clear()
             return True
     except psycopg2.Error as e:
         st.error(f"Oasis insert failed: {e}")
-        conn.rollback()
         return False
-    finally: return_connection(pool, conn)
 
 # -----------------------------------------------------
 # Archive/Backup Functions for Data Preservation
@@ -451,7 +615,8 @@ st.info(f"Current Office Time: **{now_local.strftime('%Y-%m-%d %H:%M:%S')}** ({O
 with st.expander("🔐 Admin Controls"):
     pwd = st.text_input("Enter admin password:", type="password", key="admin_pwd_main")
     
-    if pwd == RESET_PASSWORD:
+    # Nothing below (including its DB reads) runs unless a matching password was entered
+    if pwd and hmac.compare_digest(pwd.encode(), RESET_PASSWORD.encode()):
         st.success("✅ Access granted.")
 
         st.subheader("💼 Update All Display Texts (Stored in Database)")
@@ -515,7 +680,7 @@ with st.expander("🔐 Admin Controls"):
                 
                 if success_count == 6:
                     st.success("✅ All display texts saved to database and will persist permanently!")
-                    st.cache_data.clear()  # Clear cache to reload new values
+                    load_admin_settings.clear()  # Reload the new values
                     st.rerun()
                 else:
                     st.error(f"❌ Only {success_count}/6 settings saved successfully.")
@@ -524,9 +689,10 @@ with st.expander("🔐 Admin Controls"):
         if st.button("🚀 Run Project Room Allocation - DONDERDAG 16:00", key="btn_run_proj_alloc"):
             if run_allocation:
                 # Pass the static Monday date to the allocation function
-                success, _ = run_allocation(DATABASE_URL, only="project", base_monday_date=st.session_state.project_rooms_display_monday) 
+                success, _ = run_allocation(DATABASE_URL, only="project", base_monday_date=st.session_state.project_rooms_display_monday, pool=pool) 
 
                 if success:
+                    fetch_room_grid.clear()
                     st.success(f"✅ Project room allocation completed.")
                     st.rerun()
                 else:
@@ -538,7 +704,7 @@ with st.expander("🔐 Admin Controls"):
         if st.button("🎲 Run Oasis Allocation - VRIJDAG", key="btn_run_oasis_alloc"):
             if run_allocation:
                 # Pass the static Monday date to the allocation function
-                success, _ = run_allocation(DATABASE_URL, only="oasis", base_monday_date=st.session_state.oasis_display_monday) 
+                success, _ = run_allocation(DATABASE_URL, only="oasis", base_monday_date=st.session_state.oasis_display_monday, pool=pool) 
 
                 if success:
                     st.success(f"✅ Oasis allocation completed.")
@@ -552,18 +718,17 @@ with st.expander("🔐 Admin Controls"):
         try:
             current_proj_display_mon = st.session_state.project_rooms_display_monday
             alloc_df_admin = get_room_grid(pool, current_proj_display_mon)
-            if not alloc_df_admin.empty:
+            if alloc_df_admin is None:
+                st.error("Project room allocations could not be loaded, so editing is disabled to avoid overwriting them.")
+            elif not alloc_df_admin.empty:
                 editable_alloc_proj = st.data_editor(alloc_df_admin, num_rows="dynamic", use_container_width=True, key="edit_proj_allocations_data")
                 if st.button("💾 Save Project Room Allocation Changes", key="btn_save_proj_alloc_changes"):
-                    conn_admin_alloc = get_connection(pool)
-                    if not conn_admin_alloc: st.error("No DB connection")
-                    else:
-                        try:
-                            with conn_admin_alloc.cursor() as cur:
-                                week_start_date = current_proj_display_mon
-                                week_end_date = current_proj_display_mon + timedelta(days=3) 
-                                cur.execute("DELETE FROM weekly_allocations WHERE room_name != 'Oasis' AND date >= %s AND date <= %s", (week_start_date, week_end_date))
+                    try:
+                        # The inner "with conn" commits the diff on success and rolls it back on any error
+                        with borrow_connection(pool) as conn_admin_alloc:
+                            with conn_admin_alloc, conn_admin_alloc.cursor() as cur:
                                 day_indices = {"Monday": 0, "Tuesday": 1, "Wednesday": 2, "Thursday": 3}
+                                alloc_rows = []
                                 for _, row in editable_alloc_proj.iterrows(): 
                                     for day_name, day_idx in day_indices.items():
                                         value = row.get(day_name, "")
@@ -572,14 +737,14 @@ with st.expander("🔐 Admin Controls"):
                                             room_name_val = str(row["Room"]) if pd.notnull(row["Room"]) else None
                                             alloc_date = current_proj_display_mon + timedelta(days=day_idx)
                                             if team_info and room_name_val:
-                                                cur.execute("INSERT INTO weekly_allocations (team_name, room_name, date) VALUES (%s, %s, %s)", (team_info, room_name_val, alloc_date))
-                            conn_admin_alloc.commit()
-                            st.success(f"✅ Manual project room allocations updated.")
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"❌ Failed to save project room allocations: {e}")
-                            if conn_admin_alloc: conn_admin_alloc.rollback()
-                        finally: return_connection(pool, conn_admin_alloc)
+                                                alloc_rows.append((team_info, room_name_val, alloc_date))
+                                sync_project_allocations(cur, current_proj_display_mon, alloc_rows)
+                    except Exception as e:
+                        st.error(f"❌ Failed to save project room allocations: {e}")
+                    else:
+                        fetch_room_grid.clear()
+                        st.success(f"✅ Manual project room allocations updated.")
+                        st.rerun()
             else:
                 st.info(f"No project room allocations to edit.")
         except Exception as e:
@@ -587,24 +752,20 @@ with st.expander("🔐 Admin Controls"):
 
         st.subheader("🧹 Reset Project Room Data")
         if st.button(f"🗑️ Remove Project Allocations for Current Week - DONDERDAG 15:59", key="btn_reset_proj_alloc_week"):
-            conn_reset_pra = get_connection(pool)
-            if conn_reset_pra:
-                try:
-                    with conn_reset_pra.cursor() as cur:
+            try:
+                with borrow_connection(pool) as conn_reset_pra:
+                    with conn_reset_pra, conn_reset_pra.cursor() as cur:
                         mon_to_reset = st.session_state.project_rooms_display_monday
-                        cur.execute("DELETE FROM weekly_allocations WHERE room_name != 'Oasis' AND date >= %s AND date <= %s", (mon_to_reset, mon_to_reset + timedelta(days=6))) 
-                        conn_reset_pra.commit()
-                        st.success(f"✅ Project room allocations removed.")
-                        st.rerun()
-                except Exception as e: 
-                    st.error(f"❌ Failed to reset project allocations: {e}")
-                    conn_reset_pra.rollback()
-                finally: 
-                    return_connection(pool, conn_reset_pra)
+                        cur.execute(TRANSACTION_LIMITS_SQL + "DELETE FROM weekly_allocations WHERE room_name != 'Oasis' AND date >= %s AND date <= %s", (mon_to_reset, mon_to_reset + timedelta(days=6))) 
+            except Exception as e: 
+                st.error(f"❌ Failed to reset project allocations: {e}")
+            else:
+                fetch_room_grid.clear()
+                st.success(f"✅ Project room allocations removed.")
+                st.rerun()
 
         # Initialize confirmation state
-        if "show_proj_prefs_confirm" not in st.session_state:
-            st.session_state.show_proj_prefs_confirm = False
+        st.session_state.setdefault("show_proj_prefs_confirm", False)
             
         if not st.session_state.show_proj_prefs_confirm:
             if st.button("🧽 Remove All Project Room Preferences (Global Action) - DINSDAG 16:00", key="btn_reset_all_proj_prefs"):
@@ -619,23 +780,20 @@ with st.expander("🔐 Admin Controls"):
                     # First backup the data
                     backup_success = backup_weekly_preferences(pool, "admin", "Manual deletion via admin panel")
                     
-                    conn_reset_prp = get_connection(pool)
-                    if conn_reset_prp:
-                        try:
-                            with conn_reset_prp.cursor() as cur:
-                                cur.execute("DELETE FROM weekly_preferences")
-                                conn_reset_prp.commit()
-                                if backup_success:
-                                    st.success("✅ All project room preferences removed and backed up to archive.")
-                                else:
-                                    st.success("✅ All project room preferences removed. (Backup may have failed)")
-                                st.session_state.show_proj_prefs_confirm = False
-                                st.rerun()
-                        except Exception as e: 
-                            st.error(f"❌ Failed: {e}")
-                            conn_reset_prp.rollback()
-                        finally: 
-                            return_connection(pool, conn_reset_prp)
+                    try:
+                        with borrow_connection(pool) as conn_reset_prp:
+                            with conn_reset_prp, conn_reset_prp.cursor() as cur:
+                                cur.execute(TRANSACTION_LIMITS_SQL + "DELETE FROM weekly_preferences")
+                    except Exception as e: 
+                        st.error(f"❌ Failed: {e}")
+                    else:
+                        fetch_preferences.clear(); fetch_room_grid.clear()
+                        if backup_success:
+                            st.success("✅ All project room preferences removed and backed up to archive.")
+                        else:
+                            st.success("✅ All project room preferences removed. (Backup may have failed)")
+                        st.session_state.show_proj_prefs_confirm = False
+                        st.rerun()
             
             with col2:
                 if st.button("❌ Cancel", key="btn_cancel_delete_proj_prefs"):
@@ -645,20 +803,17 @@ with st.expander("🔐 Admin Controls"):
 
         st.subheader("🌾 Reset Oasis Data")
         if st.button(f"🗑️ Remove Oasis Allocations for Current Week - Vrijdag 16:00", key="btn_reset_oasis_alloc_week"):
-            conn_reset_oa = get_connection(pool)
-            if conn_reset_oa:
-                try:
-                    with conn_reset_oa.cursor() as cur:
+            try:
+                with borrow_connection(pool) as conn_reset_oa:
+                    with conn_reset_oa, conn_reset_oa.cursor() as cur:
                         mon_to_reset = st.session_state.oasis_display_monday
-                        cur.execute("DELETE FROM weekly_allocations WHERE room_name = 'Oasis' AND date >= %s AND date <= %s", (mon_to_reset, mon_to_reset + timedelta(days=6))) 
-                        conn_reset_oa.commit()
-                        st.success(f"✅ Oasis allocations removed.")
-                        st.rerun()
-                except Exception as e: st.error(f"❌ Failed to reset Oasis allocations: {e}"); conn_reset_oa.rollback()
-                finally: return_connection(pool, conn_reset_oa)
+                        cur.execute(TRANSACTION_LIMITS_SQL + "DELETE FROM weekly_allocations WHERE room_name = 'Oasis' AND date >= %s AND date <= %s", (mon_to_reset, mon_to_reset + timedelta(days=6))) 
+            except Exception as e: st.error(f"❌ Failed to reset Oasis allocations: {e}")
+            else:
+                st.success(f"✅ Oasis allocations removed.")
+                st.rerun()
           # Initialize confirmation state for Oasis
-        if "show_oasis_prefs_confirm" not in st.session_state:
-            st.session_state.show_oasis_prefs_confirm = False
+        st.session_state.setdefault("show_oasis_prefs_confirm", False)
             
         if not st.session_state.show_oasis_prefs_confirm:
             if st.button("🧽 Remove All Oasis Preferences (Global Action) - DINSDAG 16:00", key="btn_reset_all_oasis_prefs"):
@@ -673,23 +828,20 @@ with st.expander("🔐 Admin Controls"):
                     # First backup the data
                     backup_success = backup_oasis_preferences(pool, "admin", "Manual deletion via admin panel")
                     
-                    conn_reset_op = get_connection(pool)
-                    if conn_reset_op:
-                        try:
-                            with conn_reset_op.cursor() as cur:
-                                cur.execute("DELETE FROM oasis_preferences")
-                                conn_reset_op.commit()
-                                if backup_success:
-                                    st.success("✅ All Oasis preferences removed and backed up to archive.")
-                                else:
-                                    st.success("✅ All Oasis preferences removed. (Backup may have failed)")
-                                st.session_state.show_oasis_prefs_confirm = False
-                                st.rerun()
-                        except Exception as e: 
-                            st.error(f"❌ Failed: {e}")
-                            conn_reset_op.rollback()
-                        finally: 
-                            return_connection(pool, conn_reset_op)
+                    try:
+                        with borrow_connection(pool) as conn_reset_op:
+                            with conn_reset_op, conn_reset_op.cursor() as cur:
+                                cur.execute(TRANSACTION_LIMITS_SQL + "DELETE FROM oasis_preferences")
+                    except Exception as e: 
+                        st.error(f"❌ Failed: {e}")
+                    else:
+                        fetch_oasis_preferences.clear()
+                        if backup_success:
+                            st.success("✅ All Oasis preferences removed and backed up to archive.")
+                        else:
+                            st.success("✅ All Oasis preferences removed. (Backup may have failed)")
+                        st.session_state.show_oasis_prefs_confirm = False
+                        st.rerun()
             
             with col2:
                 if st.button("❌ Cancel", key="btn_cancel_delete_oasis_prefs"):
@@ -698,43 +850,47 @@ with st.expander("🔐 Admin Controls"):
 
         st.subheader("🧾 Team Preferences (Admin Edit - Global)")
         df_team_prefs_admin = get_preferences(pool)
-        if not df_team_prefs_admin.empty:
+        if df_team_prefs_admin is None:
+            st.error("Team preferences could not be loaded, so editing is disabled to avoid overwriting them.")
+        elif not df_team_prefs_admin.empty:
             editable_team_df = st.data_editor(df_team_prefs_admin, num_rows="dynamic", use_container_width=True, key="edit_teams_prefs_data")
             if st.button("💾 Save Team Preference Changes", key="btn_save_team_prefs_changes"):
-                conn_admin_tp = get_connection(pool)
-                if conn_admin_tp:
-                    try:
-                        with conn_admin_tp.cursor() as cur:
-                            cur.execute("DELETE FROM weekly_preferences")
+                try:
+                    with borrow_connection(pool) as conn_admin_tp:
+                        with conn_admin_tp, conn_admin_tp.cursor() as cur:
+                            team_rows = []
+                            # Naive UTC throughout, so unchanged rows compare equal in the sync's IS DISTINCT FROM
+                            saved_at = datetime.now(timezone.utc).replace(tzinfo=None)
                             for _, row in editable_team_df.iterrows():
-                                sub_time = row.get("Submitted At", datetime.now(pytz.utc))
-                                if pd.isna(sub_time) or sub_time is None: sub_time = datetime.now(pytz.utc)
-                                cur.execute("INSERT INTO weekly_preferences (team_name, contact_person, team_size, preferred_days, submission_time) VALUES (%s, %s, %s, %s, %s)",
-                                            (row["Team"], row["Contact"], int(row["Size"]), row["Days"], sub_time) )
-                            conn_admin_tp.commit(); st.success("✅ Team preferences updated."); st.rerun()
-                    except Exception as e: st.error(f"❌ Failed to update team preferences: {e}"); conn_admin_tp.rollback()
-                    finally: return_connection(pool, conn_admin_tp)
+                                sub_time = to_naive_utc(row.get("Submitted At"), saved_at)
+                                team_rows.append((row["Team"], row["Contact"], int(row["Size"]), row["Days"], sub_time))
+                            sync_preferences(cur, team_rows)
+                except Exception as e: st.error(f"❌ Failed to update team preferences: {e}")
+                else: fetch_preferences.clear(); fetch_room_grid.clear(); st.success("✅ Team preferences updated."); st.rerun()
         else: st.info("No team preferences submitted yet to edit.")
 
         st.subheader("🌿 Oasis Preferences (Admin Edit - Global)")
         df_oasis_prefs_admin = get_oasis_preferences(pool)
-        if not df_oasis_prefs_admin.empty:
+        if df_oasis_prefs_admin is None:
+            st.error("Oasis preferences could not be loaded, so editing is disabled to avoid overwriting them.")
+        elif not df_oasis_prefs_admin.empty:
             cols_to_display = ["Person", "Day 1", "Day 2", "Day 3", "Day 4", "Day 5", "Submitted At"]
             editable_oasis_df_prefs = st.data_editor(df_oasis_prefs_admin[cols_to_display], num_rows="dynamic", use_container_width=True, key="edit_oasis_prefs_data")
             if st.button("💾 Save Oasis Preference Changes", key="btn_save_oasis_prefs_changes"):
-                conn_admin_op = get_connection(pool)
-                if conn_admin_op:
-                    try:
-                        with conn_admin_op.cursor() as cur:
-                            cur.execute("DELETE FROM oasis_preferences")
+                try:
+                    with borrow_connection(pool) as conn_admin_op:
+                        with conn_admin_op, conn_admin_op.cursor() as cur:
+                            oasis_rows = []
+                            # Naive UTC throughout, so unchanged rows compare equal in the sync's IS DISTINCT FROM
+                            saved_at = datetime.now(timezone.utc).replace(tzinfo=None)
                             for _, row in editable_oasis_df_prefs.iterrows():
-                                sub_time = row.get("Submitted At", datetime.now(pytz.utc))
-                                if pd.isna(sub_time) or sub_time is None: sub_time = datetime.now(pytz.utc)
-                                cur.execute("INSERT INTO oasis_preferences (person_name, preferred_day_1, preferred_day_2, preferred_day_3, preferred_day_4, preferred_day_5, submission_time) VALUES (%s, %s, %s, %s, %s, %s, %s)",
-                                            (row["Person"], row.get("Day 1"), row.get("Day 2"), row.get("Day 3"), row.get("Day 4"), row.get("Day 5"), sub_time))
-                            conn_admin_op.commit(); st.success("✅ Oasis preferences updated."); st.rerun()
-                    except Exception as e: st.error(f"❌ Failed to update oasis preferences: {e}"); conn_admin_op.rollback()
-                    finally: return_connection(pool, conn_admin_op)
+                                sub_time = to_naive_utc(row.get("Submitted At"), saved_at)
+                                # Empty cells come back from the editor as NaN; store them as NULL
+                                days = [None if pd.isna(row.get(col)) else row.get(col) for col in ["Day 1", "Day 2", "Day 3", "Day 4", "Day 5"]]
+                                oasis_rows.append((row["Person"], *days, sub_time))
+                            sync_oasis_preferences(cur, oasis_rows)
+                except Exception as e: st.error(f"❌ Failed to update oasis preferences: {e}")
+                else: fetch_oasis_preferences.clear(); st.success("✅ Oasis preferences updated."); st.rerun()
         else: st.info("No oasis preferences submitted yet to edit.")
 
     elif pwd: 
@@ -797,7 +953,9 @@ with st.form("oasis_form_main"):
 st.header("📌 Project Room Allocations")
 st.markdown(admin_settings['project_allocations_display_markdown_content']) 
 alloc_display_df = get_room_grid(pool, st.session_state.project_rooms_display_monday) 
-if alloc_display_df.empty:
+if alloc_display_df is None:
+    pass  # get_room_grid has already shown the warning
+elif alloc_display_df.empty:
     st.write(f"No project room allocations yet.")
 else:
     st.dataframe(alloc_display_df, use_container_width=True, hide_index=True)
@@ -829,36 +987,36 @@ if add_adhoc_submit:
                         name_clean = adhoc_oasis_name.strip().title()
                         days_map_indices = {"Monday": 0, "Tuesday": 1, "Wednesday": 2, "Thursday": 3, "Friday": 4}
                         
-                        # First, check if the confirmed column exists
-                        has_confirmed_column = False
-                        try:
-                            cur.execute("SELECT confirmed FROM weekly_allocations LIMIT 1")
-                            has_confirmed_column = True
-                        except psycopg2.errors.UndefinedColumn:
-                            # Column doesn't exist, rollback and continue without it
-                            conn_adhoc.rollback()
-                            has_confirmed_column = False
-                        
-                        # Remove existing entries for this person on selected days
-                        for day_str in adhoc_oasis_days: 
-                            date_obj_check = current_oasis_display_mon_adhoc + timedelta(days=days_map_indices[day_str])
-                            cur.execute("DELETE FROM weekly_allocations WHERE room_name = 'Oasis' AND team_name = %s AND date = %s", (name_clean, date_obj_check))
-                        
+                        adhoc_dates = {
+                            day_str: current_oasis_display_mon_adhoc + timedelta(days=days_map_indices[day_str])
+                            for day_str in adhoc_oasis_days
+                        }
+                        adhoc_params = {"name": name_clean, "dates": list(adhoc_dates.values()), "capacity": oasis.get("capacity", 12)}
+
+                        # Lock the selected days, then remove existing entries for this person on them
+                        cur.execute(TRANSACTION_LIMITS_SQL + OASIS_DAY_LOCK_SQL + "DELETE FROM weekly_allocations WHERE room_name = 'Oasis' AND team_name = %(name)s AND date = ANY(%(dates)s)", adhoc_params)
+
+                        # Insert on every selected day that still has a free spot, in one statement
+                        # (use the confirmed column if it exists)
+                        confirmed_column, confirmed_value = (", confirmed", ", FALSE") if has_confirmed_column(pool) else ("", "")
+                        cur.execute(
+                            "WITH candidates AS (SELECT unnest(%(dates)s::date[]) AS date), "
+                            "counts AS (SELECT date, COUNT(*) AS taken FROM weekly_allocations "
+                            "WHERE room_name = 'Oasis' AND date = ANY(%(dates)s) GROUP BY date) "
+                            f"INSERT INTO weekly_allocations (team_name, room_name, date{confirmed_column}) "
+                            f"SELECT %(name)s, 'Oasis', candidates.date{confirmed_value} "
+                            "FROM candidates LEFT JOIN counts USING (date) "
+                            "WHERE COALESCE(counts.taken, 0) < %(capacity)s RETURNING date",
+                            adhoc_params
+                        )
+                        added_dates = {row[0] for row in cur.fetchall()}
+
                         added_to_all_selected = True
-                        for day_str in adhoc_oasis_days:
-                            date_obj = current_oasis_display_mon_adhoc + timedelta(days=days_map_indices[day_str])
-                            cur.execute("SELECT COUNT(*) FROM weekly_allocations WHERE room_name = 'Oasis' AND date = %s", (date_obj,))
-                            count = cur.fetchone()[0]
-                            if count >= oasis.get("capacity", 12):
+                        for day_str, date_obj in adhoc_dates.items():
+                            if date_obj not in added_dates:
                                 st.warning(f"⚠️ Oasis is full on {day_str}. Could not add {name_clean}.")
                                 added_to_all_selected = False
-                            else:
-                                # Insert allocation - use confirmed column if it exists
-                                if has_confirmed_column:
-                                    cur.execute("INSERT INTO weekly_allocations (team_name, room_name, date, confirmed) VALUES (%s, 'Oasis', %s, %s)", (name_clean, date_obj, False))
-                                else:
-                                    cur.execute("INSERT INTO weekly_allocations (team_name, room_name, date) VALUES (%s, 'Oasis', %s)", (name_clean, date_obj))
-                        
+
                         conn_adhoc.commit()
                         if added_to_all_selected and adhoc_oasis_days:
                             st.success(f"✅ {name_clean} added to Oasis for selected day(s)! Please confirm attendance via the matrix below.")
@@ -927,8 +1085,7 @@ else:
         st.subheader("🪑 Oasis Availability Summary")
         current_day_alloc_counts = {day_dt: 0 for day_dt in oasis_overview_days_dates}
         if not df_matrix_data.empty:
-            for day_dt_check in oasis_overview_days_dates:
-                current_day_alloc_counts[day_dt_check] = df_matrix_data[df_matrix_data["Date"] == day_dt_check]["Name"].nunique()
+            current_day_alloc_counts.update(df_matrix_data.groupby("Date")["Name"].nunique().to_dict())
         
         for day_dt, day_str_label in zip(oasis_overview_days_dates, oasis_overview_day_names):
             used_spots = current_day_alloc_counts[day_dt]
@@ -945,42 +1102,40 @@ else:
         if st.button("💾 Save Oasis Matrix Changes", key="btn_save_oasis_matrix_changes"):
             try:
                 with conn_matrix.cursor() as cur:
-                    # Check if confirmed column exists
-                    cur.execute("SELECT column_name FROM information_schema.columns WHERE table_name = 'weekly_allocations' AND column_name = 'confirmed'")
-                    has_confirmed_col = cur.fetchone() is not None
+                    has_confirmed_col = has_confirmed_column(pool)
+                    # Insert allocations (confirmed if column exists)
+                    if has_confirmed_col:
+                        matrix_insert_sql = "INSERT INTO weekly_allocations (team_name, room_name, date, confirmed, confirmed_at) VALUES %s"
+                        matrix_row_template = "(%s, 'Oasis', %s, TRUE, NOW())"
+                    else:
+                        matrix_insert_sql = "INSERT INTO weekly_allocations (team_name, room_name, date) VALUES %s"
+                        matrix_row_template = "(%s, 'Oasis', %s)"
                     
-                    # Delete existing Oasis allocations for this week
-                    cur.execute("DELETE FROM weekly_allocations WHERE room_name = 'Oasis' AND team_name != 'Niek' AND date >= %s AND date <= %s", (oasis_overview_monday_display, oasis_overview_days_dates[-1]))
-                    if "Niek" in edited_matrix.index: 
-                        cur.execute("DELETE FROM weekly_allocations WHERE room_name = 'Oasis' AND team_name = 'Niek' AND date >= %s AND date <= %s", (oasis_overview_monday_display, oasis_overview_days_dates[-1]))
-                        for day_idx, day_col_name in enumerate(oasis_overview_day_names):
-                            if edited_matrix.at["Niek", day_col_name]:
-                                # Insert allocation for Niek
-                                if has_confirmed_col:
-                                    cur.execute("INSERT INTO weekly_allocations (team_name, room_name, date, confirmed, confirmed_at) VALUES (%s, %s, %s, %s, NOW())", ("Niek", "Oasis", oasis_overview_monday_display + timedelta(days=day_idx), True))
-                                else:
-                                    cur.execute("INSERT INTO weekly_allocations (team_name, room_name, date) VALUES (%s, %s, %s)", ("Niek", "Oasis", oasis_overview_monday_display + timedelta(days=day_idx)))
+                    # Delete existing Oasis allocations for this week (Niek's only when Niek is in the matrix)
+                    niek_in_matrix = "Niek" in edited_matrix.index
+                    cur.execute(TRANSACTION_LIMITS_SQL + "DELETE FROM weekly_allocations WHERE room_name = 'Oasis' AND (team_name != 'Niek' OR %s) AND date >= %s AND date <= %s", (niek_in_matrix, oasis_overview_monday_display, oasis_overview_days_dates[-1]))
                     
+                    matrix_rows = []
                     occupied_counts_per_day = {day_col: 0 for day_col in oasis_overview_day_names}
-                    if "Niek" in edited_matrix.index: 
-                        for day_col_name in oasis_overview_day_names:
+                    if niek_in_matrix: 
+                        for day_idx, day_col_name in enumerate(oasis_overview_day_names):
                             if edited_matrix.at["Niek", day_col_name]:
-                                occupied_counts_per_day[day_col_name] +=1
+                                matrix_rows.append(("Niek", oasis_overview_days_dates[day_idx]))
+                                occupied_counts_per_day[day_col_name] += 1
                                 
-                    for person_name_matrix in edited_matrix.index: 
+                    for person_name_matrix, person_days in zip(edited_matrix.index, edited_matrix.to_numpy()): 
                         if person_name_matrix == "Niek": continue 
-                        for day_idx, day_col_name in enumerate(oasis_overview_day_names):
-                            if edited_matrix.at[person_name_matrix, day_col_name]: 
-                                if occupied_counts_per_day[day_col_name] < oasis_capacity:
-                                    date_obj_alloc = oasis_overview_monday_display + timedelta(days=day_idx)
-                                    # Insert allocation (confirmed if column exists)
-                                    if has_confirmed_col:
-                                        cur.execute("INSERT INTO weekly_allocations (team_name, room_name, date, confirmed, confirmed_at) VALUES (%s, %s, %s, %s, NOW())", (person_name_matrix, "Oasis", date_obj_alloc, True))
-                                    else:
-                                        cur.execute("INSERT INTO weekly_allocations (team_name, room_name, date) VALUES (%s, %s, %s)", (person_name_matrix, "Oasis", date_obj_alloc))
-                                    occupied_counts_per_day[day_col_name] += 1
-                                else:
-                                    st.warning(f"⚠️ {person_name_matrix} could not be added to Oasis on {day_col_name}: capacity reached.")
+                        for day_idx, is_selected in enumerate(person_days):
+                            if not is_selected: continue
+                            day_col_name = oasis_overview_day_names[day_idx]
+                            if occupied_counts_per_day[day_col_name] < oasis_capacity:
+                                matrix_rows.append((person_name_matrix, oasis_overview_days_dates[day_idx]))
+                                occupied_counts_per_day[day_col_name] += 1
+                            else:
+                                st.warning(f"⚠️ {person_name_matrix} could not be added to Oasis on {day_col_name}: capacity reached.")
+                    
+                    if matrix_rows:
+                        execute_values(cur, matrix_insert_sql, matrix_rows, template=matrix_row_template, page_size=500)
                                     
                     conn_matrix.commit()
                     if has_confirmed_col:
@@ -56,3 +56,6 @@ CREATE INDEX idx_weekly_prefs_arch_team ON weekly_preferences_archive(team_name)
 CREATE INDEX idx_oasis_prefs_arch_person ON oasis_preferences_archive(person_name);
 CREATE INDEX idx_weekly_alloc_arch_date ON weekly_allocations_archive(date);
 CREATE INDEX idx_weekly_alloc_confirmed ON weekly_allocations(confirmed) WHERE room_name = 'Oasis';
+-- One-time DDL: week-scoped clears and lookups in run_allocation filter on date and room_name
+CREATE INDEX IF NOT EXISTS idx_weekly_alloc_date_room ON weekly_allocations(date, room_name);
+-- The unique preference indexes live in unique_preference_indexes.sql (run it outside a transaction)
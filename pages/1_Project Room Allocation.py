@@ -1,12 +1,15 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timedelta
-import pytz
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from allocate_rooms import run_allocation, get_db_connection_pool, get_room_grid, get_preferences
 
 st.set_page_config(page_title="Project Room Allocation", layout="wide")
 
-OFFICE_TIMEZONE = pytz.timezone("Europe/Amsterdam")
+try:
+    OFFICE_TIMEZONE = ZoneInfo("Europe/Amsterdam")
+except (ZoneInfoNotFoundError, ValueError):
+    OFFICE_TIMEZONE = timezone.utc
 pool = get_db_connection_pool()
 
 st.title("📌 Project Room Allocation")
@@ -1,7 +1,8 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timedelta
-import pytz
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import hmac
 import sys
 import os
 
@@ -16,13 +17,14 @@ OFFICE_TIMEZONE_STR = st.secrets.get("OFFICE_TIMEZONE", os.environ.get("OFFICE_T
 RESET_PASSWORD = "trainee"
 
 try:
-    OFFICE_TIMEZONE = pytz.timezone(OFFICE_TIMEZONE_STR)
-except pytz.UnknownTimeZoneError:
-    OFFICE_TIMEZONE = pytz.utc
+    OFFICE_TIMEZONE = ZoneInfo(OFFICE_TIMEZONE_STR)
+except (ZoneInfoNotFoundError, ValueError):
+    OFFICE_TIMEZONE = timezone.utc
 
 # --- Import from main app ---
 try:
-    from app import get_db_connection_pool, get_connection, return_connection, oasis
+    from app import (get_db_connection_pool, get_connection, return_connection, borrow_connection, oasis,
+                     TRANSACTION_LIMITS_SQL, OASIS_DAY_LOCK_SQL)
 except ImportError:
     st.error("❌ Could not import from main app. Please check file structure.")
     st.stop()
@@ -30,53 +32,63 @@ except ImportError:
 from allocate_rooms import run_allocation
 
 # --- Functions ---
-def get_oasis_grid(pool):
-    conn = get_connection(pool)
+# Read caches below are dropped (fetch_*.clear()) after every successful write on this page.
+# They raise on database errors so a failed read is never cached; the get_* wrappers report it.
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_oasis_grid(_pool, week_monday):
+    if not _pool: return pd.DataFrame()
+    with borrow_connection(_pool) as conn, conn.cursor() as cur:
+        # Only the displayed Monday-Friday, so older weeks don't pile into the weekday columns;
+        # names are de-duplicated and joined server-side, one row per occupied day
+        cur.execute(
+            "SELECT date, string_agg(DISTINCT team_name, ', ' ORDER BY team_name) FROM weekly_allocations "
+            "WHERE room_name = 'Oasis' AND date >= %s AND date <= %s GROUP BY date",
+            (week_monday, week_monday + timedelta(days=4))
+        )
+        people_by_date = dict(cur.fetchall())
+    if not people_by_date:
+        return pd.DataFrame()
+
+    all_days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+    return pd.DataFrame({
+        "Weekday": all_days,
+        "People": [people_by_date.get(week_monday + timedelta(days=i), "Vacant") for i in range(len(all_days))]
+    })
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_oasis_preferences(_pool):
+    if not _pool: return pd.DataFrame()
+    with borrow_connection(_pool) as conn, conn.cursor() as cur:
+        cur.execute("SELECT person_name, preferred_day_1, preferred_day_2, preferred_day_3, preferred_day_4, preferred_day_5, submission_time FROM oasis_preferences")
+        rows = cur.fetchall()
+    if not rows:
+        return pd.DataFrame()
+
+    # Process the data to show all preferred days in a readable format
+    processed_rows = []
+    for row in rows:
+        name = row[0]
+        days = [day for day in row[1:6] if day is not None]
+        days_str = ", ".join(days) if days else "None"
+        processed_rows.append([name, days_str, row[6]])
+
+    return pd.DataFrame(processed_rows, columns=["Person", "Preferred Days", "Submitted At"])
+
+def get_oasis_grid(pool, week_monday):
+    """Oasis grid for the week, or None (after a warning) if it could not be loaded"""
     try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT team_name, room_name, date FROM weekly_allocations WHERE room_name = 'Oasis'")
-            data = cur.fetchall()
-            if not data:
-                return pd.DataFrame()
-            df = pd.DataFrame(data, columns=["Person", "Room", "Date"])
-            df["Date"] = pd.to_datetime(df["Date"])
-            df["Day"] = df["Date"].dt.strftime('%A')
-
-            all_days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-            grouped = df.groupby("Day")["Person"].apply(lambda x: ", ".join(sorted(set(x))))
-            grouped = grouped.reindex(all_days, fill_value="Vacant").reset_index()
-            grouped = grouped.rename(columns={"Day": "Weekday", "Person": "People"})
-
-            return grouped
+        return fetch_oasis_grid(pool, week_monday)
     except Exception as e:
         st.warning(f"Failed to load oasis allocation data: {e}")
-        return pd.DataFrame()
-    finally:
-        return_connection(pool, conn)
+        return None
 
 def get_oasis_preferences(pool):
-    conn = get_connection(pool)
+    """Oasis preferences, or None (after a warning) if they could not be loaded"""
     try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT person_name, preferred_day_1, preferred_day_2, preferred_day_3, preferred_day_4, preferred_day_5, submission_time FROM oasis_preferences")
-            rows = cur.fetchall()
-            if not rows:
-                return pd.DataFrame()
-            
-            # Process the data to show all preferred days in a readable format
-            processed_rows = []
-            for row in rows:
-                name = row[0]
-                days = [day for day in row[1:6] if day is not None]
-                days_str = ", ".join(days) if days else "None"
-                processed_rows.append([name, days_str, row[6]])
-            
-            return pd.DataFrame(processed_rows, columns=["Person", "Preferred Days", "Submitted At"])
+        return fetch_oasis_preferences(pool)
     except Exception as e:
         st.warning(f"Failed to fetch oasis preferences: {e}")
-        return pd.DataFrame()
-    finally:
-        return_connection(pool, conn)
+        return None
 
 # --- Main Content ---
 pool = get_db_connection_pool()
@@ -87,10 +99,15 @@ st.title("🌿 Oasis Overview and Manual Signup")
 now_local = datetime.now(OFFICE_TIMEZONE)
 st.info(f"**Current Office Time:** {now_local.strftime('%Y-%m-%d %H:%M:%S')} ({OFFICE_TIMEZONE_STR})")
 
+today = now_local.date()
+this_monday = today - timedelta(days=today.weekday())
+
 # Current allocations
 st.header("📊 Current Oasis Allocations")
-oasis_df = get_oasis_grid(pool)
-if not oasis_df.empty:
+oasis_df = get_oasis_grid(pool, this_monday)
+if oasis_df is None:
+    pass  # get_oasis_grid has already shown the warning
+elif not oasis_df.empty:
     st.dataframe(oasis_df, use_container_width=True)
 else:
     st.info("No Oasis allocations yet.")
@@ -98,16 +115,15 @@ else:
 # Preferences
 st.header("📝 Submitted Oasis Preferences")
 prefs_df = get_oasis_preferences(pool)
-if not prefs_df.empty:
+if prefs_df is None:
+    pass  # get_oasis_preferences has already shown the warning
+elif not prefs_df.empty:
     st.dataframe(prefs_df, use_container_width=True)
     st.info(f"📊 **Summary:** {len(prefs_df)} people submitted preferences")
 else:
     st.info("No Oasis preferences submitted yet.")
 
 # Manual add form
-today = datetime.now(OFFICE_TIMEZONE).date()
-this_monday = today - timedelta(days=today.weekday())
-
 st.header("➕ Add Yourself to Oasis (Emergency/Manual)")
 st.warning("⚠️ Use this only if you missed the regular submission deadline!")
 
@@ -128,23 +144,27 @@ with st.form("oasis_add_form"):
                 with conn.cursor() as cur:
                     name_clean = new_name.strip().title()
 
-                    # Remove existing entries for this user
-                    cur.execute("""
-                        DELETE FROM weekly_allocations
-                        WHERE room_name = 'Oasis' AND team_name = %s
-                    """, (name_clean,))
-
-                    for day in new_days:
-                        date_obj = this_monday + timedelta(days=["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"].index(day))
+                    day_dates = {
+                        day: this_monday + timedelta(days=["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"].index(day))
+                        for day in new_days
+                    }
 
-                        # Check current occupancy
-                        cur.execute("""
-                            SELECT COUNT(*) FROM weekly_allocations
-                            WHERE room_name = 'Oasis' AND date = %s
-                        """, (date_obj,))
-                        count = cur.fetchone()[0]
+                    # Lock the selected days until commit, then remove existing entries for this user
+                    cur.execute(TRANSACTION_LIMITS_SQL + OASIS_DAY_LOCK_SQL + """
+                        DELETE FROM weekly_allocations
+                        WHERE room_name = 'Oasis' AND team_name = %(name)s
+                    """, {"name": name_clean, "dates": list(day_dates.values())})
 
-                        if count >= oasis["capacity"]:
+                    # Check current occupancy of all selected days at once
+                    cur.execute("""
+                        SELECT date, COUNT(*) FROM weekly_allocations
+                        WHERE room_name = 'Oasis' AND date = ANY(%s)
+                        GROUP BY date
+                    """, (list(day_dates.values()),))
+                    occupancy = dict(cur.fetchall())
+
+                    for day, date_obj in day_dates.items():
+                        if occupancy.get(date_obj, 0) >= oasis["capacity"]:
                             st.warning(f"Oasis is full on {day}, not added.")
                         else:
                             cur.execute("""
@@ -153,6 +173,7 @@ with st.form("oasis_add_form"):
                             """, (name_clean, date_obj))
 
                     conn.commit()
+                    fetch_oasis_grid.clear()
                     st.success("✅ You're added to the selected days!")
                     st.rerun()
             except Exception as e:
@@ -164,7 +185,7 @@ with st.form("oasis_add_form"):
 # Admin controls
 with st.expander("🔐 Admin Controls"):
     pwd = st.text_input("Enter admin password:", type="password", key="oasis_admin")
-    if pwd == RESET_PASSWORD:
+    if pwd and hmac.compare_digest(pwd.encode(), RESET_PASSWORD.encode()):
         st.success("✅ Access granted.")
 
         col1, col2 = st.columns(2)
@@ -172,8 +193,9 @@ with st.expander("🔐 Admin Controls"):
         with col1:
             if st.button("🎲 Run Oasis Allocation"):
                 with st.spinner("Running oasis allocation..."):
-                    success, _ = run_allocation(DATABASE_URL, only="oasis")
+                    success, _ = run_allocation(DATABASE_URL, only="oasis", base_monday_date=this_monday, pool=pool)
                     if success:
+                        fetch_oasis_grid.clear()
                         st.success("✅ Oasis allocation completed.")
                         st.rerun()
                     else:
@@ -184,8 +206,9 @@ with st.expander("🔐 Admin Controls"):
                 conn = get_connection(pool)
                 try:
                     with conn.cursor() as cur:
-                        cur.execute("DELETE FROM weekly_allocations WHERE room_name = 'Oasis'")
+                        cur.execute(TRANSACTION_LIMITS_SQL + "DELETE FROM weekly_allocations WHERE room_name = 'Oasis'")
                         conn.commit()
+                        fetch_oasis_grid.clear()
                         st.success("✅ Oasis allocations removed.")
                         st.rerun()
                 except Exception as e:
@@ -198,8 +221,9 @@ with st.expander("🔐 Admin Controls"):
             conn = get_connection(pool)
             try:
                 with conn.cursor() as cur:
-                    cur.execute("DELETE FROM oasis_preferences")
+                    cur.execute(TRANSACTION_LIMITS_SQL + "DELETE FROM oasis_preferences")
                     conn.commit()
+                    fetch_oasis_preferences.clear()
                     st.success("✅ Oasis preferences removed.")
                     st.rerun()
             except Exception as e:
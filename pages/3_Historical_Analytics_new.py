@@ -2,8 +2,8 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime, timedelta, date
-import pytz
+from datetime import datetime, timedelta, date, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import sys
 import os
 
@@ -18,9 +18,9 @@ OFFICE_TIMEZONE_STR = st.secrets.get("OFFICE_TIMEZONE", os.environ.get("OFFICE_T
 RESET_PASSWORD = "trainee"
 
 try:
-    OFFICE_TIMEZONE = pytz.timezone(OFFICE_TIMEZONE_STR)
-except pytz.UnknownTimeZoneError:
-    OFFICE_TIMEZONE = pytz.utc
+    OFFICE_TIMEZONE = ZoneInfo(OFFICE_TIMEZONE_STR)
+except (ZoneInfoNotFoundError, ValueError):
+    OFFICE_TIMEZONE = timezone.utc
 
 # --- Import from main app ---
 try:
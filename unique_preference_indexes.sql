@@ -0,0 +1,29 @@
+-- One preference per team / per person, enforced by the database
+-- With these indexes in place, the ON CONFLICT inserts in app.py also cover concurrent submits.
+--
+-- Run this file OUTSIDE a transaction block: CREATE/DROP INDEX CONCURRENTLY refuse to run inside one.
+--   psql:                  psql "$SUPABASE_DB_URI" -f unique_preference_indexes.sql   (no -1 / --single-transaction)
+--   Supabase SQL Editor:   run the statements one at a time (a pasted script runs as a single transaction)
+--
+-- The file is safe to re-run. If an index build fails (e.g. a duplicate slipped in after the clean-up),
+-- Postgres leaves an INVALID index behind that CREATE ... IF NOT EXISTS would skip forever,
+-- so each index is dropped before it is (re)built.
+
+-- 1. Remove duplicates, keeping the most recent submission per team / person
+--    (preview with: SELECT team_name, COUNT(*) FROM weekly_preferences GROUP BY team_name HAVING COUNT(*) > 1;)
+DELETE FROM weekly_preferences a
+USING weekly_preferences b
+WHERE a.team_name = b.team_name
+  AND (COALESCE(a.submission_time, '-infinity'), a.ctid) < (COALESCE(b.submission_time, '-infinity'), b.ctid);
+
+DELETE FROM oasis_preferences a
+USING oasis_preferences b
+WHERE a.person_name = b.person_name
+  AND (COALESCE(a.submission_time, '-infinity'), a.ctid) < (COALESCE(b.submission_time, '-infinity'), b.ctid);
+
+-- 2. Build the unique indexes without blocking submissions
+DROP INDEX CONCURRENTLY IF EXISTS idx_weekly_prefs_team;
+CREATE UNIQUE INDEX CONCURRENTLY idx_weekly_prefs_team ON weekly_preferences(team_name);
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_oasis_prefs_person;
+CREATE UNIQUE INDEX CONCURRENTLY idx_oasis_prefs_person ON oasis_preferences(person_name);